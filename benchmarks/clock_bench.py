@@ -0,0 +1,68 @@
+"""
+对比ClockPlugin旧的渲染方式（每秒生成完整SVG -> cairosvg 200x200 -> PIL缩放）
+和预渲染表盘+指针图集合成的方式，模拟多个时区时钟连续运行。
+
+    python benchmarks/clock_bench.py --clocks 3 --seconds 600 --size 100
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import cairosvg
+from PIL import Image
+
+from plugins.clock_face import ClockFace
+from plugins.clock_plugin import generate_clock_svg
+
+
+def ticks(seconds, clocks):
+    for t in range(seconds):
+        for c in range(clocks):
+            # 不同时区的时钟错开小时
+            yield (t // 3600 + c * 5) % 24, (t // 60) % 60, t % 60
+
+
+def svg_render(size, hour, minute, second):
+    png_data = cairosvg.svg2png(bytestring=generate_clock_svg(hour, minute, second))
+    icon = Image.open(BytesIO(png_data)).convert("RGBA")
+    icon.thumbnail(size, Image.LANCZOS)
+    return icon
+
+
+def bench(name, render, args):
+    start = time.perf_counter()
+    frames = 0
+    for hour, minute, second in ticks(args.seconds, args.clocks):
+        render(hour, minute, second)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {frames} frames  {elapsed:.3f}s  {elapsed / frames * 1000:.3f} ms/frame")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClockPlugin render benchmark")
+    parser.add_argument("--clocks", type=int, default=3)
+    parser.add_argument("--seconds", type=int, default=600)
+    parser.add_argument("--size", type=int, default=100)
+    args = parser.parse_args()
+    size = (args.size, args.size)
+
+    baseline = bench("svg", lambda h, m, s: svg_render(size, h, m, s), args)
+
+    start = time.perf_counter()
+    face = ClockFace(size)
+    print(f"{'face init':<12} {time.perf_counter() - start:.3f}s")
+    sprites = bench("sprite", face.render, args)
+    # 图集填满后的稳态开销
+    steady = bench("sprite warm", face.render, args)
+
+    print(f"speedup: {baseline / sprites:.1f}x (cold atlas), {baseline / steady:.1f}x (warm atlas)")
+
+
+if __name__ == "__main__":
+    main()
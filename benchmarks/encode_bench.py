@@ -0,0 +1,68 @@
+"""
+比较不同JPEG编码参数在按键尺寸上的耗时、体积和画质（PSNR，相对于未压缩的源图）。
+
+    python benchmarks/encode_bench.py --repeat 200
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageStat
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+
+from plugins.encoder import _encode
+
+QUALITIES = [100, 95, 90, 85, 75]
+SUBSAMPLINGS = [0, 2]  # 4:4:4, 4:2:0
+
+
+def sample_key(size):
+    # 图标 + 多行文字，接近实际按键内容
+    image = Image.new("RGB", (size, size), "black")
+    icon = Image.open(os.path.join(ROOT, "Assets", "btc.png")).convert("RGBA")
+    icon.thumbnail((size, size))
+    image.paste(icon, (0, 0), icon)
+    font = ImageFont.truetype(os.path.join(ROOT, "Assets", "Roboto-Regular.ttf"), size // 5)
+    draw = ImageDraw.Draw(image)
+    for i, (line, color) in enumerate([("67512 $", "white"), ("24H:", "white"), ("66890 $", "yellow")]):
+        draw.text((size // 2, (i + 1) * size // 4), line, font=font, anchor="ms", fill=color)
+    return image
+
+
+def psnr(a, b):
+    diff = ImageChops.difference(a, b)
+    mse = sum(v * v for v in ImageStat.Stat(diff).rms) / 3
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="native key encoder benchmark")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'size':>5} {'quality':>7} {'subs':>4} {'opt':>5} {'ms/enc':>8} {'bytes':>6} {'psnr':>6}")
+    for size in (72, 100):
+        source = sample_key(size)
+        image_format = {"size": (size, size), "format": "JPEG", "rotation": 0, "flip": (False, False)}
+        for quality in QUALITIES:
+            for subsampling in SUBSAMPLINGS:
+                for optimize in (False, True):
+                    params = {"quality": quality, "subsampling": subsampling, "optimize": optimize}
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        native = _encode(source, image_format, params)
+                    elapsed = (time.perf_counter() - start) / args.repeat
+                    decoded = Image.open(BytesIO(native)).convert("RGB")
+                    print(
+                        f"{size:>5} {quality:>7} {subsampling:>4} {str(optimize):>5} "
+                        f"{elapsed * 1000:>8.3f} {len(native):>6} {psnr(source, decoded):>6.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
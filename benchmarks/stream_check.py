@@ -0,0 +1,74 @@
+"""
+用 ticker_server 的本地 WebSocket 服务检查 WebSocketSource：按 --rate 推送、--drop 秒后断开，
+运行 --seconds 秒后检查按 fps 限速合并、断线后重连并重新订阅。有检查不通过时退出码为1，
+可以放进 CI 或部署前的脚本里。
+
+    python benchmarks/stream_check.py --rate 50 --fps 2 --drop 3 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from websockets.asyncio.server import serve
+
+from plugins.btc_plugin import BtcPlugin
+from plugins.circuit_breaker import Backoff
+from plugins.plugin import WebSocketSource
+from ticker_server import handler
+
+
+async def check(args):
+    # 断线后尽快重连，检查在几秒内完成
+    Backoff.base, Backoff.cap = 0.1, 0.5
+    plugin = BtcPlugin(stream=True)
+    values = []
+    async with serve(lambda ws: handler(ws, args.rate, args.drop), "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        source = WebSocketSource(
+            f"ws://127.0.0.1:{port}",
+            values.append,
+            parse=plugin.parse_ticker,
+            max_fps=args.fps,
+            subscribe=[{"action": "subscribe", "channel": "ticker", "symbol": "BTC-USD"}],
+        )
+        source.start()
+        await asyncio.sleep(args.seconds)
+        source.stop()
+
+    stats = source.stats()
+    print(stats)
+    failures = []
+    if not values:
+        failures.append("no ticker delivered")
+    elif "last_trade_price" not in values[-1]:
+        failures.append(f"incomplete ticker delivered: {values[-1]}")
+    # 每个连接开始时可以立即交付一次，其余按 fps 限速
+    limit = args.seconds * args.fps + stats["reconnects"] + 1
+    if stats["delivered"] > limit:
+        failures.append(f"delivered {stats['delivered']} > {limit:.0f}, fps cap not applied")
+    if args.rate > args.fps and stats["coalesced"] <= 0:
+        failures.append("no updates coalesced")
+    if args.drop and args.drop < args.seconds and stats["reconnects"] < 1:
+        failures.append("did not reconnect after the server dropped the connection")
+    if stats["errors"]:
+        failures.append(f"{stats['errors']} stream errors")
+    for failure in failures:
+        print("FAIL:", failure)
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocketSource check against ticker_server")
+    parser.add_argument("--rate", type=float, default=50, help="每秒推送的更新数")
+    parser.add_argument("--fps", type=float, default=2, help="WebSocketSource 的 max_fps")
+    parser.add_argument("--drop", type=float, default=3, help="N秒后服务端断开连接，0表示不断开")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
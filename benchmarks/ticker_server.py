@@ -0,0 +1,52 @@
+"""
+本地模拟的 blockchain.com ticker WebSocket 服务，用于测试 BtcPlugin 的推送模式和断线重连。
+订阅后先发一条 snapshot，之后按 --rate 每秒推送 updated；--drop 秒后主动断开连接。
+
+    python benchmarks/ticker_server.py --port 8765 --rate 20 --drop 30
+
+config.json 中的 BtcPlugin 配置 "stream": true, "stream_url": "ws://127.0.0.1:8765"
+自动检查见 benchmarks/stream_check.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from websockets.asyncio.server import serve
+
+
+def ticker(event, symbol, price, **fields):
+    return json.dumps(
+        {"seqnum": int(time.time() * 1000), "event": event, "channel": "ticker",
+         "symbol": symbol, "last_trade_price": price, **fields}
+    )
+
+
+async def handler(ws, rate, drop):
+    request = json.loads(await ws.recv())
+    symbol = request.get("symbol", "BTC-USD")
+    price = 60000.0
+    await ws.send(ticker("snapshot", symbol, price, price_24h=59000.0, volume_24h=1234.5))
+    started = time.monotonic()
+    while not drop or time.monotonic() - started < drop:
+        await asyncio.sleep(1 / rate)
+        price += random.uniform(-20, 20)
+        await ws.send(ticker("updated", symbol, round(price, 2)))
+    await ws.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=20, help="每秒推送的更新数")
+    parser.add_argument("--drop", type=float, default=0, help="N秒后断开连接，0表示不断开")
+    args = parser.parse_args()
+
+    async with serve(lambda ws: handler(ws, args.rate, args.drop), "127.0.0.1", args.port):
+        print(f"ticker stand-in listening on ws://127.0.0.1:{args.port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,27 @@
 import asyncio
+import contextvars
+import hashlib
 import json
 import logging
 import os
 import time
 
-from plugins import PLUGIN_CLASSES, StreamPi
+from PIL import Image
+
+from plugins import PLUGIN_CLASSES, StreamPi, plugin_registry
+from plugins.bus import bus
+from plugins.circuit_breaker import Backoff, CircuitBreaker
+from plugins.compositor import compositor_for
+from plugins.encoder import NativeEncoder
+from plugins.executor import blocking_executor
+from plugins.fetch_cache import FetchCache, fetch_cache, revalidations, stale_ok
+from plugins.http_pool import HttpClientPool
+from plugins.key_writer import key_writer
+from plugins.render_pool import render_pool
+from plugins.scheduler import PollScheduler, poll_scheduler
+from plugins.warm_store import warm_store
+from plugins.streamdeck import PRESSED_MARGINS
+from plugins.validators import Validators
 
 logger = logging.getLogger("asyncio")
 
@@ -16,6 +33,14 @@ last_key_up_task = None
 last_long_press_task = None
 DOUBLE_KEY_INTERVAL = 0.3  # seconds
 LONG_PRESS_INTERVAL = 1  # seconds
+PRERENDER_INTERVAL = 120  # seconds
+PRERENDER_TIMEOUT = 10  # seconds，单个按键预取的超时
+scene_frames = {}  # scene index -> 每个按键最后渲染的Frame
+persisted_frames = {}  # frame id -> 已写入warm store的帧摘要
+warm_task = None
+watch_task = None
+reload_lock = asyncio.Lock()
+CONFIG_PATH = "./config.json"
 
 
 def create_plugin(plugin_type, **kwargs):
@@ -26,42 +51,129 @@ def create_plugin(plugin_type, **kwargs):
 
 
 def init_from_json(json_data):
-    plugin_global_config = {}  # plugin type str -> dict
-    plugin_pages = []
-
     # set up how to show text on key image
     StreamPi.initialize(json_data)
+    HttpClientPool.initialize(json_data.get("http", {}))
+    blocking_executor.initialize(json_data.get("executor", {}))
+    FetchCache.initialize(json_data.get("fetch_cache", {}))
+    Validators.initialize(json_data.get("fetch_cache", {}))
+    CircuitBreaker.initialize(json_data.get("circuit_breaker", {}))
+    Backoff.initialize(json_data.get("http", {}))
+    PollScheduler.initialize(json_data.get("scheduler", {}))
+    warm_store.initialize(json_data.get("warm_store", {}))
+    for key, (value, expires) in warm_store.load_fetches().items():
+        fetch_cache.restore(key, value, expires)
+    fetch_cache.on_store = warm_store.put_fetch
+
+    plugin_pages = build_scenes(json_data)
+    plugin_registry.log_report()
+    return plugin_pages
 
+
+def build_scenes(json_data, previous=()):
+    """
+    根据配置创建各页的插件。previous 是当前的 scenes：配置摘要相同的插件直接复用旧对象，
+    先复用同一位置的，再复用移动了位置的，保留它们的数据、缓存和任务
+    """
+    plugin_global_config = {}  # plugin type str -> dict
     for plugin_config in json_data["plugins"]:
+        plugin_config = dict(plugin_config)
         plugin_type = plugin_config.pop("type")
         plugin_global_config[plugin_type] = plugin_config
 
+    # 只导入配置里用到的插件模块
+    used_types = set(plugin_global_config)
+    for page in json_data["scenes"]:
+        used_types.update(c.get("type") or "DummyPlugin" for c in page)
+    for plugin_type in plugin_registry.load(sorted(used_types)):
+        logger.warning(f"Unknown plugin type in config: {plugin_type}")
+
+    pages = []
     for page in json_data["scenes"]:
-        plugins = []
+        configs = []
         for plugin_config in page:
+            plugin_config = dict(plugin_config)
             plugin_type = plugin_config.get("type") or "DummyPlugin"
             if plugin_type in plugin_global_config:
                 plugin_config.update(plugin_global_config[plugin_type])
-            plugin = create_plugin(plugin_type, **plugin_config)
-            plugins.append(plugin)
-        plugin_pages.append(plugins)
+            configs.append((plugin_type, plugin_config, config_digest(plugin_config)))
+        pages.append(configs)
+
+    plugin_pages = [[None] * len(configs) for configs in pages]
+    reused = set()
+    for scene, configs in enumerate(pages):
+        for key, (_, _, digest) in enumerate(configs):
+            old = plugin_at(previous, scene, key)
+            if old is not None and old.config_digest == digest:
+                plugin_pages[scene][key] = old
+                reused.add(id(old))
+
+    spare = {}  # config digest -> 没有留在原位置的旧插件
+    for plugins in previous:
+        for p in plugins:
+            if id(p) not in reused:
+                spare.setdefault(p.config_digest, []).append(p)
+
+    for scene, configs in enumerate(pages):
+        for key, (plugin_type, plugin_config, digest) in enumerate(configs):
+            if plugin_pages[scene][key] is not None:
+                continue
+            if spare.get(digest):
+                plugin = spare[digest].pop(0)
+            else:
+                plugin = create_plugin(plugin_type, **plugin_config)
+                plugin.config_digest = digest
+            plugin_pages[scene][key] = plugin
     return plugin_pages
 
 
+def config_digest(plugin_config):
+    return hashlib.blake2b(
+        json.dumps(plugin_config, sort_keys=True, default=str).encode(),
+        digest_size=8,
+    ).hexdigest()
+
+
+def plugin_at(plugin_pages, scene, key):
+    if scene < len(plugin_pages) and key < len(plugin_pages[scene]):
+        return plugin_pages[scene][key]
+    return None
+
+
+def same_plugin(old_scenes, new_scenes, scene, key):
+    old = plugin_at(old_scenes, scene, key)
+    return old is not None and old is plugin_at(new_scenes, scene, key)
+
+
 def load_json_file(file_path):
     with open(file_path, "r") as file:
         return json.load(file)
 
 
+async def handle_key_event(p, handler, deck):
+    """
+    执行按键事件处理：处理过程中用了缓存旧值的，等后台刷新完成后用新数据再画一次
+    """
+    pending = []
+    revalidations.set(pending)
+    await handler(deck)
+    if not pending:
+        return
+    await asyncio.gather(*pending, return_exceptions=True)
+    if not p.stop:
+        await p.prefetch()
+        p.update_screen(deck)
+
+
 async def delay_and_key_up(p, deck_keys, key):
     await asyncio.sleep(DOUBLE_KEY_INTERVAL)  # Wait for 0.3 seconds
-    await p.on_key_up(deck_keys[key])
+    await handle_key_event(p, p.on_key_up, deck_keys[key])
 
 
 async def delay_and_long_press(p, deck_keys, key):
     await asyncio.sleep(LONG_PRESS_INTERVAL)  # Wait for 3 seconds
     print("long press task executed", flush=True)
-    await p.on_key_long_pressed(deck_keys[key])
+    await handle_key_event(p, p.on_key_long_pressed, deck_keys[key])
 
 
 async def key_change_callback(deck, key, state):
@@ -72,6 +184,9 @@ async def key_change_callback(deck, key, state):
         key_press_times, \
         last_key_up_task, \
         last_long_press_task
+    pressed_at = time.perf_counter()
+    # 按键触发的刷新不等网络，先用缓存的旧数据；只作用于这里创建的按键处理任务
+    token = stale_ok.set(True)
     print("Deck {} Key {} = {}".format(deck.id(), key, state), flush=True)
     try:
         p = scences[scence_index][key]
@@ -96,11 +211,12 @@ async def key_change_callback(deck, key, state):
             if last_key_up_task and not last_key_up_task.done():
                 print(last_key_up_task, " key up task cancelled")
                 last_key_up_task.cancel()
-            asyncio.create_task(p.on_key_double_click(deck_keys[key]))
+            asyncio.create_task(
+                handle_key_event(p, p.on_key_double_click, deck_keys[key])
+            )
 
         if not state:
             # keep lcd on
-            margins = [0, 0, 0, 0]
             if StreamPi.lcd_off:
                 await dm.set_bright_level(StreamPi.bright_level)
             else:
@@ -110,24 +226,51 @@ async def key_change_callback(deck, key, state):
                     )
 
         else:
-            margins = [10, 10, 10, 10]
-            asyncio.create_task(p.on_key_down(deck_keys[key]))
+            asyncio.create_task(handle_key_event(p, p.on_key_down, deck_keys[key]))
 
-        image = deck_keys[key].key_image
-        if image:
-            image = PILHelper.create_scaled_key_image(deck, image, margins=margins)
-            deck.set_key_image(key, PILHelper.to_native_key_format(deck, image))
+        # 按键反馈优先于后台刷新，立即写入；按下/松开两种状态在渲染时已经编码好
+        frame = deck_keys[key].frame
+        if frame:
+            if state:
+                native, digest = frame.pressed, frame.pressed_digest
+            else:
+                native, digest = frame.native, frame.digest
+            compositor_for(deck).submit(
+                key, native, digest, urgent=True, since=pressed_at
+            )
+        elif deck_keys[key].key_image:
+            margins = PRESSED_MARGINS if state else [0, 0, 0, 0]
+            image = PILHelper.create_scaled_key_image(
+                deck, deck_keys[key].key_image, margins=margins
+            )
+            compositor_for(deck).submit(
+                key,
+                NativeEncoder.encode(deck, image),
+                urgent=True,
+                since=pressed_at,
+            )
 
     except Exception as e:
         logger.exception(e)
+    finally:
+        stale_ok.reset(token)
 
 
 async def next_page(delta=1):
     global scences, scence_index, deck_keys, tasks
     cancel_tasks()
 
-    for index, p in enumerate(scences[scence_index]):
-        asyncio.create_task(p.on_will_disappear(deck_keys[index]))
+    # 等旧页面的插件都停下来再切换，避免它们把旧内容画到新页面的按键上
+    await asyncio.gather(
+        *(
+            p.on_will_disappear(deck_keys[index])
+            for index, p in enumerate(scences[scence_index])
+        ),
+        return_exceptions=True,
+    )
+    scene_frames[scence_index] = [
+        deck_keys[index].frame for index in range(len(scences[scence_index]))
+    ]
 
     scence_index = scence_index + delta
     if scence_index < 0:
@@ -136,8 +279,254 @@ async def next_page(delta=1):
     if scence_index >= len(scences):
         scence_index = 0
 
+    paint_cached_frames(scence_index)
+    # 翻页通常由按键触发，新页面的任务不继承按键处理的上下文
     for index, p in enumerate(scences[scence_index]):
-        tasks.append(asyncio.create_task(p.on_will_appear(deck_keys[index])))
+        tasks.append(
+            asyncio.create_task(
+                p.on_will_appear(deck_keys[index]), context=appear_context()
+            )
+        )
+    tasks.append(
+        asyncio.create_task(
+            prerender_adjacent_scenes(), context=contextvars.Context()
+        )
+    )
+
+
+def appear_context():
+    """
+    插件出现时使用的上下文：翻页不等网络，有旧值（包括从warm store恢复的）就先用，后台再刷新
+    """
+    context = contextvars.Context()
+    context.run(stale_ok.set, True)
+    return context
+
+
+def paint_cached_frames(index):
+    """
+    用缓存的帧一次性刷新整页，插件随后再各自刷新数据
+    """
+    compositor = None
+    frames = scene_frames.get(index, [])
+    for key in range(len(scences[index])):
+        frame = frames[key] if key < len(frames) else None
+        # 没有缓存帧的按键可能还带着上一页的标记，按这一页重新设置
+        deck_keys[key].restored = bool(frame)
+        if frame:
+            deck_keys[key].frame = frame
+            deck_keys[key].key_image = frame.image
+            compositor = compositor_for(deck_keys[key].deck)
+            compositor.submit(key, frame.native, frame.digest)
+    if compositor:
+        compositor.flush()
+
+
+async def prerender_adjacent_scenes():
+    """
+    后台预热前后两页：插件预取数据后在渲染线程池里生成帧，不写设备
+    """
+    while True:
+        count = len(scences)
+        for index in {(scence_index - 1) % count, (scence_index + 1) % count}:
+            if index != scence_index:
+                await prerender_scene(index)
+        await asyncio.sleep(PRERENDER_INTERVAL)
+
+
+async def prerender_scene(index):
+    # 各按键并发预取，单个按键慢或卡住（例如等待首次登录）不拖住整页
+    frames = scene_frames.setdefault(index, [None] * len(scences[index]))
+    await asyncio.gather(
+        *(prerender_key(index, key, p, frames) for key, p in enumerate(scences[index]))
+    )
+
+
+async def prerender_key(index, key, p, frames):
+    try:
+        await asyncio.wait_for(p.prefetch(), PRERENDER_TIMEOUT)
+        frame = await render_pool.submit(
+            ("prerender", index, key),
+            deck_keys[key].render_frame,
+            *p.render_args(),
+        )
+        if frame:
+            frames[key] = frame
+    except asyncio.TimeoutError:
+        logger.warning(f"prefetch {p.__class__.__name__} on page {index} timed out")
+    except Exception as e:
+        logger.exception(e)
+
+
+def frame_id(scene, key):
+    return f"{scene}:{key}:{scences[scene][key].config_digest}"
+
+
+def restore_warm_state():
+    frames = warm_store.load_frames()
+    for scene, plugins in enumerate(scences):
+        scene_frames[scene] = [
+            frames.get(frame_id(scene, key)) for key in range(len(plugins))
+        ]
+        for key, frame in enumerate(scene_frames[scene]):
+            if frame:
+                persisted_frames[frame_id(scene, key)] = frame.digest
+    warm_store.prune_frames(live_frame_ids())
+
+
+def live_frame_ids():
+    return {
+        frame_id(scene, key)
+        for scene, plugins in enumerate(scences)
+        for key in range(len(plugins))
+    }
+
+
+def save_warm_state():
+    """
+    把各页最后渲染的帧交给warm store，只提交有变化的
+    """
+    frames = dict(scene_frames)
+    frames[scence_index] = [
+        getattr(deck_keys[key], "frame", None)
+        for key in range(len(scences[scence_index]))
+    ]
+    for scene, scene_frame_list in frames.items():
+        for key, frame in enumerate(scene_frame_list):
+            if not frame or scene >= len(scences) or key >= len(scences[scene]):
+                continue
+            fid = frame_id(scene, key)
+            if persisted_frames.get(fid) != frame.digest:
+                warm_store.put_frame(fid, frame)
+                persisted_frames[fid] = frame.digest
+
+
+async def persist_warm_state():
+    while True:
+        await asyncio.sleep(warm_store.flush_interval)
+        try:
+            save_warm_state()
+            await warm_store.flush_async()
+        except Exception as e:
+            logger.exception(e)
+
+
+async def reload_config(path=None):
+    """
+    重新读取配置并和当前的 scenes 比较：只重建配置有变化的插件，当前页没变的按键不重绘、
+    任务继续运行；插件和页面以外的配置需要重启才生效
+    """
+    # 文件监视和 /admin/reload 可能同时触发，一次只做一个重新加载
+    async with reload_lock:
+        return await _reload_config(path or CONFIG_PATH)
+
+
+async def _reload_config(path):
+    global config, scences, scence_index
+    new_config = load_json_file(path)
+    if not new_config.get("scenes"):
+        raise ValueError(f"{path} has no scenes")
+    restart_required = sorted(
+        k
+        for k in set(config) | set(new_config)
+        if k not in ("plugins", "scenes") and config.get(k) != new_config.get(k)
+    )
+    if restart_required:
+        logger.warning(f"config {restart_required} changed, restart to apply")
+
+    # 先创建好全部插件，配置有错误时保持原样
+    old_scenes = scences
+    new_scenes = build_scenes(new_config, old_scenes)
+    kept = {id(p) for plugins in new_scenes for p in plugins}
+    dropped = [p for plugins in old_scenes for p in plugins if id(p) not in kept]
+
+    old_index = scence_index
+    old_page = old_scenes[old_index] if old_index < len(old_scenes) else []
+    if scence_index >= len(new_scenes):
+        scence_index = 0
+    new_page = new_scenes[scence_index]
+
+    # 按新的页面重建预渲染帧：删掉不存在的页面，长度和新页面一致，只保留位置没有变化的插件的帧
+    for scene in list(scene_frames):
+        if scene >= len(new_scenes):
+            del scene_frames[scene]
+            continue
+        frames = scene_frames[scene]
+        scene_frames[scene] = [
+            frames[key]
+            if key < len(frames) and same_plugin(old_scenes, new_scenes, scene, key)
+            else None
+            for key in range(len(new_scenes[scene]))
+        ]
+    config = new_config
+    scences = new_scenes
+    # 配置变化后旧的帧id（scene:key:config_digest）不会再用到
+    live = live_frame_ids()
+    for fid in [fid for fid in persisted_frames if fid not in live]:
+        del persisted_frames[fid]
+    warm_store.prune_frames(live)
+
+    changed_keys = []
+    if dm.deck is not None:
+        for index in range(max(len(plugins) for plugins in scences)):
+            if not isinstance(deck_keys[index], StreamPi):
+                deck_keys[index] = StreamPi(deck=dm.deck, key=index)
+        for key in range(max(len(old_page), len(new_page))):
+            old = old_page[key] if key < len(old_page) else None
+            new = new_page[key] if key < len(new_page) else None
+            if old is new and old_index == scence_index:
+                continue
+            changed_keys.append(key)
+            if old is not None:
+                await old.on_will_disappear(deck_keys[key])
+            if new is None:
+                blank = Image.new("RGB", deck_keys[key].key_image_size(), "black")
+                deck_keys[key].write_image(blank)
+        # 所有旧插件都停下后再启动新插件，移动位置的插件不会被后面的disappear停掉
+        for key in changed_keys:
+            if key < len(new_page):
+                task = asyncio.create_task(
+                    new_page[key].on_will_appear(deck_keys[key]),
+                    context=appear_context(),
+                )
+                tasks.append(task)
+
+    for p in dropped:
+        poll_scheduler.unregister(p)
+        try:
+            await p.on_unload()
+        except Exception as e:
+            logger.exception(e)
+
+    previous = {id(p) for plugins in old_scenes for p in plugins}
+    return {
+        "reused": len(kept & previous),
+        "created": len(kept - previous),
+        "removed": len(dropped),
+        "repainted_keys": changed_keys,
+        "restart_required": restart_required,
+    }
+
+
+async def watch_config(path, interval):
+    """
+    轮询配置文件的修改时间，变化后自动重新加载
+    """
+    last = os.stat(path).st_mtime_ns
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        if mtime == last:
+            continue
+        last = mtime
+        try:
+            logger.info(f"reloaded {path}: {await reload_config(path)}")
+        except Exception as e:
+            # 编辑器可能写到一半，下次修改后再试
+            logger.error(f"Failed to reload {path}: {e}")
 
 
 def cancel_tasks():
@@ -148,6 +537,7 @@ def cancel_tasks():
 
 
 async def start():
+    global warm_task, watch_task
     streamdecks = DeviceManager().enumerate()
     print("Found {} Stream Deck(s).\n".format(len(streamdecks)))
     for index, deck in enumerate(streamdecks):
@@ -158,10 +548,24 @@ async def start():
         dm.open()
         dm.set_key_callback_async(key_change_callback)
 
-        for index, p in enumerate(scences[scence_index]):
+        for index in range(max(len(scene) for scene in scences)):
             deck_keys[index] = StreamPi(deck=deck, key=index)
-            task = asyncio.create_task(p.on_will_appear(deck_keys[index]))
+        # 先用上次运行保存的帧画出整页，插件随后再刷新
+        restore_warm_state()
+        paint_cached_frames(scence_index)
+        if warm_store.enabled and warm_task is None:
+            warm_task = asyncio.create_task(persist_warm_state())
+        reload = config.get("reload", {})
+        if reload.get("watch") and watch_task is None:
+            watch_task = asyncio.create_task(
+                watch_config(CONFIG_PATH, reload.get("interval", 2))
+            )
+        for index, p in enumerate(scences[scence_index]):
+            task = asyncio.create_task(
+                p.on_will_appear(deck_keys[index]), context=appear_context()
+            )
             tasks.append(task)
+        tasks.append(asyncio.create_task(prerender_adjacent_scenes()))
         return
 
 
@@ -226,6 +630,8 @@ class DeviceManagerDelegate:
                 self.deck.clearAllIcon()
             else:
                 self.deck.reset()
+            compositor_for(self.deck).clear()
+            key_writer.invalidate(self.deck)
             self.deck.set_brightness(StreamPi.bright_level)
 
     # 关闭
@@ -238,14 +644,26 @@ class DeviceManagerDelegate:
             else:
                 self.deck.reset()
                 self.deck.set_brightness(0)
+            compositor_for(self.deck).close()
+            key_writer.invalidate(self.deck)
             self.deck.close()
 
 
-config = load_json_file("./config.json")
+config = load_json_file(CONFIG_PATH)
+PRERENDER_INTERVAL = config.get("prerender", {}).get("interval", PRERENDER_INTERVAL)
+PRERENDER_TIMEOUT = config.get("prerender", {}).get("timeout", PRERENDER_TIMEOUT)
 scences = init_from_json(config)
 dm = DeviceManagerDelegate(config.get("device_model"))
 DeviceManager, PILHelper = dm.import_device_manager()
 
+# 翻页、亮灭屏等管理命令注册到进程内总线，插件和 /admin 路由共用
+bus.register("admin.next", lambda: next_page(1))
+bus.register("admin.prev", lambda: next_page(-1))
+bus.register("admin.lcd_on", dm.screen_on)
+bus.register("admin.lcd_off", dm.screen_off)
+bus.register("admin.down", dm.close)
+bus.register("admin.reload", reload_config)
+
 if __name__ == "__main__":
     import uvloop
 
@@ -8,9 +8,13 @@ import traceback
 import uvicorn
 from contextlib import asynccontextmanager
 
-from cli import start as stream_deck_start, dm, next_page
+from cli import start as stream_deck_start, dm, save_warm_state
 from routers import streamdeck
 from plugins import PLUGIN_ROUTERS
+from plugins.executor import blocking_executor
+from plugins.http_pool import HttpClientPool
+from plugins.render_pool import render_pool
+from plugins.warm_store import warm_store
 
 logger = logging.getLogger("streampi")
 
@@ -29,13 +33,18 @@ async def lifespan(app: FastAPI):
     loop.set_exception_handler(handle_exception)    
     asyncio.create_task(stream_deck_start())
     yield    
-    dm.close()
+    try:
+        save_warm_state()
+    finally:
+        warm_store.close()
+        dm.close()
+        render_pool.shutdown()
+        blocking_executor.shutdown()
+        await HttpClientPool.aclose()
 
 app = FastAPI(lifespan=lifespan)
 
 # registering streampi admin routers
-streamdeck.dm = dm
-streamdeck.next_page = next_page
 app.include_router(streamdeck.router)
 
 # registering 3rd party plugin routers
@@ -1,30 +1,117 @@
+import ast
 import os
 import importlib
+import logging
+import time
 from plugins.streamdeck import StreamDeck as StreamPi
 
-PLUGIN_CLASSES = {}
-PLUGIN_ROUTERS = {}
+logger = logging.getLogger("streampi")
 
 def convert_to_camel_case(s: str) -> str:
     parts = s.split('_')
     return ''.join(part.capitalize() for part in parts)
 
-# Scan current folder for plugins
-for filename in os.listdir(os.path.dirname(__file__)):
-    if filename.endswith("_plugin.py"):            
-        module_name = filename[:-3]  # Remove the '.py' extension
-        module = importlib.import_module(f"plugins.{module_name}", package=__name__)
-        plugin_class_name = convert_to_camel_case(module_name)
-        plugin_class = getattr(module, plugin_class_name, None)
+class PluginRegistry:
+    '''
+    插件注册表：启动时只用 ast 解析 *_plugin.py 得到插件类名和是否定义了 router，不导入模块；
+    配置里用到的插件类型才真正导入，pandas、uptime_kuma_api、dingtalk_stream 等依赖只在需要时加载
+    '''
+
+    def __init__(self, folder):
+        self.modules = {}  # plugin class name -> module name
+        self.has_router = {}  # plugin class name -> bool
+        self.classes = {}  # plugin class name -> 已导入的插件类
+        self.routers = {}  # plugin class name -> 已导入模块的 router
+        self.import_times = {}  # plugin class name -> 导入耗时（秒）
+        self._scan(folder)
+
+    def _scan(self, folder):
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith("_plugin.py"):
+                continue
+            module_name = filename[:-3]  # Remove the '.py' extension
+            plugin_class_name = convert_to_camel_case(module_name)
+            with open(os.path.join(folder, filename), encoding="utf-8") as f:
+                tree = ast.parse(f.read(), filename)
+            names = set()
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef):
+                    names.add(node.name)
+                elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                    if isinstance(node, ast.Assign):
+                        targets = node.targets
+                    else:
+                        targets = [node.target]
+                    names.update(t.id for t in targets if isinstance(t, ast.Name))
+            if plugin_class_name in names:
+                self.modules[plugin_class_name] = module_name
+                self.has_router[plugin_class_name] = "router" in names
+
+    def __contains__(self, name):
+        return name in self.modules
+
+    def get(self, name, default=None):
+        if name not in self.modules:
+            return default
+        if name not in self.classes:
+            self._import(name)
+        return self.classes.get(name, default)
+
+    def __getitem__(self, name):
+        plugin_class = self.get(name)
+        if plugin_class is None:
+            raise KeyError(name)
+        return plugin_class
+
+    def keys(self):
+        return self.modules.keys()
+
+    def _import(self, name):
+        start = time.perf_counter()
+        module = importlib.import_module(f"plugins.{self.modules[name]}", package=__name__)
+        self.import_times[name] = time.perf_counter() - start
+        plugin_class = getattr(module, name, None)
         if plugin_class:
-            print("Loading streampi plugin: ", plugin_class_name, plugin_class)
-            PLUGIN_CLASSES[plugin_class_name] = plugin_class
-            
-        if hasattr(module, 'router'):
-            PLUGIN_ROUTERS[plugin_class_name] = module.router
+            print("Loading streampi plugin: ", name, plugin_class)
+            self.classes[name] = plugin_class
+        if self.has_router[name] and hasattr(module, 'router'):
+            self.routers[name] = module.router
+
+    def load(self, names):
+        """
+        导入配置中用到的插件类型，返回未知的类型名
+        """
+        unknown = []
+        for name in names:
+            if name in self.modules:
+                self.get(name)
+            else:
+                unknown.append(name)
+        return unknown
+
+    def report(self):
+        return {
+            "loaded": {name: round(t * 1000, 1) for name, t in self.import_times.items()},
+            "skipped": sorted(set(self.modules) - set(self.classes)),
+            "total_ms": round(sum(self.import_times.values()) * 1000, 1),
+        }
+
+    def log_report(self):
+        report = self.report()
+        for name, ms in sorted(report["loaded"].items(), key=lambda x: -x[1]):
+            logger.info(f"plugin {name} imported in {ms} ms")
+        skipped = ", ".join(report["skipped"]) or "-"
+        logger.info(f"plugins imported in {report['total_ms']} ms, not used: {skipped}")
+
+plugin_registry = PluginRegistry(os.path.dirname(__file__))
+
+# 兼容原来的用法：PLUGIN_CLASSES.get(type) 按需导入，PLUGIN_ROUTERS 只包含已导入插件的 router
+PLUGIN_CLASSES = plugin_registry
+PLUGIN_ROUTERS = plugin_registry.routers
 
 __all__ = [
     "StreamPi",
     "PLUGIN_CLASSES",
-    "PLUGIN_ROUTERS"
-]
\ No newline at end of file
+    "PLUGIN_ROUTERS",
+    "plugin_registry",
+]
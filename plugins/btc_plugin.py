@@ -1,12 +1,24 @@
-import asyncio
+import json
+from typing import Any
 
-from .plugin import StreamDeckPlugin
+from pydantic import Field
 
+from .plugin import StreamDeckPlugin, WebSocketSource
+
+BTC_URL = "https://api.blockchain.com/v3/exchange/tickers/BTC-USDT"
+BTC_STREAM_URL = "wss://ws.blockchain.info/mercury-gateway/v1/ws"
 
 class BtcPlugin(StreamDeckPlugin):
     key_up_count: int = 0
     proxy: str = ""
     token: str = ""
+    stream: bool = False  # 订阅 WebSocket ticker 推送，代替按 interval 轮询
+    stream_url: str = BTC_STREAM_URL  # 可以指向本地的模拟服务器
+    stream_symbol: str = "BTC-USD"
+    stream_fps: float = 1.0  # 推送时每秒最多重绘次数
+    ticker: dict = Field(default_factory=dict)
+
+    _source: Any = None
 
     def __init__(self, proxy: str = "", token: str = "", **data):
         super().__init__(**data)
@@ -14,38 +26,101 @@ class BtcPlugin(StreamDeckPlugin):
         self.token = token
 
     async def fetch_btc_data(self):
-        url = "https://api.blockchain.com/v3/exchange/tickers/BTC-USDT"
         return await self.async_fetch_data(
-            url,
+            BTC_URL,
             proxy=self.proxy,
+            on_disconnect=lambda: self.on_stream_disconnect(deck),
             headers={
                 "Accept": "application/json",
                 "X-API-Token": self.token,
             },
         )
 
-    async def update_deck(self, deck):
-        self.update_screen(deck)
+    def format_title(self, data):
+        if self.key_up_count % 2 == 0:
+            self.title = f"{int(data['last_trade_price'])} $\n\n24H:\n{int(data['price_24h'])} $"
+        else:
+            self.title = f"\n{data['symbol']}\n\nVolume 24H:\n{data['volume_24h']}"
+
+    async def prefetch(self):
+        if self.stream and self.has_ticker():
+            self.format_title(self.ticker)
+            return self.ticker
         data = await self.fetch_btc_data()
         if data:
             # print(data)
-            if self.key_up_count % 2 == 0:
-                self.title = f"{int(data['last_trade_price'])} $\n\n24H:\n{int(data['price_24h'])} $"
-            else:
-                self.title = f"\n{data['symbol']}\n\nVolume 24H:\n{data['volume_24h']}"
+            self.format_title(data)
+        elif self.upstream_down(BTC_URL):
+            self.title = "\nUpstream\nDown"
+        return data
+
+    async def update_deck(self, deck):
+        self.show_placeholder(deck)
+        # 没有数据但熔断器打开时也要重绘，显示 Upstream Down
+        if await self.prefetch() or self.upstream_down(BTC_URL):
             self.update_screen(deck)
 
-    async def run(self, deck):
-        while not self.stop:
+    def parse_ticker(self, message):
+        # snapshot 是完整行情，updated 只带变化的字段，合并到最新行情上
+        data = json.loads(message)
+        if data.get("channel") != "ticker":
+            return None
+        if data.get("event") not in ("snapshot", "updated"):
+            return None
+        self.ticker = {**self.ticker, **data}
+        if not self.has_ticker():
+            return None
+        return self.ticker
+
+    def has_ticker(self):
+        return "last_trade_price" in self.ticker and "price_24h" in self.ticker
+
+    # 推送模式下还没收到行情（刚出现、连不上或断线重连中）时用REST拉取
+    async def poll_until_ticker(self, deck):
+        if not self.has_ticker():
             await self.update_deck(deck)
-            await asyncio.sleep(self.interval)
 
-    async def on_will_appear(self, deck) -> None:
+    def on_stream_disconnect(self, deck):
+        self.ticker = {}
+        self.schedule(deck, self.poll_until_ticker)
+
+    def show_ticker(self, deck, ticker):
+        self.format_title(ticker)
         self.update_screen(deck)
-        await self.run(deck)
+
+    def start_stream(self, deck):
+        self._source = WebSocketSource(
+            self.stream_url,
+            lambda ticker: self.show_ticker(deck, ticker),
+            parse=self.parse_ticker,
+            max_fps=self.stream_fps,
+            proxy=self.proxy,
+            headers={"Origin": "https://exchange.blockchain.com"},
+            subscribe=[
+                {"action": "subscribe", "channel": "ticker", "symbol": self.stream_symbol}
+            ],
+        )
+        self._source.start()
+
+    def stop_stream(self):
+        if self._source:
+            self._source.stop()
+            self._source = None
+        self.ticker = {}
+
+    async def on_will_appear(self, deck) -> None:
+        await super().on_will_appear(deck)
+        self.show_placeholder(deck)
+        if self.stream:
+            # 不可见时断开连接，重新出现时用snapshot重建行情；收到第一条行情前先用REST
+            self.start_stream(deck)
+            self.schedule(deck, self.poll_until_ticker)
+        else:
+            self.schedule(deck, self.update_deck)
 
     async def on_will_disappear(self, deck) -> None:
-        pass
+        await super().on_will_disappear(deck)
+        self.stop_stream()
 
     async def on_key_up(self, deck) -> None:
         self.key_up_count = self.key_up_count + 1
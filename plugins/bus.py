@@ -0,0 +1,61 @@
+import inspect
+import time
+
+
+class CommandBus:
+    """
+    进程内的命令/查询总线：FastAPI路由和插件共用同一组处理函数。
+    插件直接按名字调用，不再经过 HTTP 回环访问自己的服务（省掉连接、序列化和事件循环往返），
+    路由只是把HTTP参数转给总线的薄适配层
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._stats = {}  # name -> [calls, errors, total_seconds]
+
+    def register(self, name, handler=None):
+        """
+        注册处理函数，可以直接调用也可以当装饰器用：@bus.register("admin.next")
+        """
+        if handler is None:
+            return lambda func: self.register(name, func)
+        self._handlers[name] = handler
+        self._stats.setdefault(name, [0, 0, 0.0])
+        return handler
+
+    def unregister(self, name):
+        self._handlers.pop(name, None)
+
+    def has(self, name):
+        return name in self._handlers
+
+    async def call(self, name, **kwargs):
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise KeyError(f"no handler registered for {name}")
+        stat = self._stats[name]
+        start = time.perf_counter()
+        try:
+            result = handler(**kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception:
+            stat[1] += 1
+            raise
+        finally:
+            stat[0] += 1
+            stat[2] += time.perf_counter() - start
+
+    def stats(self):
+        return {
+            name: {
+                "calls": calls,
+                "errors": errors,
+                "avg_ms": total / calls * 1000 if calls else 0.0,
+            }
+            for name, (calls, errors, total) in self._stats.items()
+        }
+
+
+bus = CommandBus()
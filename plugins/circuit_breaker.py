@@ -0,0 +1,114 @@
+import random
+import time
+from urllib.parse import urlsplit
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    按host的熔断器：连续失败 failure_threshold 次后打开，reset_timeout 秒内直接失败、不走网络；
+    之后进入半开状态放一个探测请求，成功则关闭，失败则重新打开并把等待时间翻倍（上限 max_reset_timeout）
+    """
+
+    failure_threshold = 3
+    reset_timeout = 30  # seconds
+    max_reset_timeout = 600  # seconds
+
+    _breakers = {}
+
+    @classmethod
+    def initialize(cls, config):
+        cls.failure_threshold = config.get("failure_threshold", cls.failure_threshold)
+        cls.reset_timeout = config.get("reset_timeout", cls.reset_timeout)
+        cls.max_reset_timeout = config.get("max_reset_timeout", cls.max_reset_timeout)
+
+    @classmethod
+    def for_url(cls, url):
+        host = urlsplit(str(url)).netloc
+        breaker = cls._breakers.get(host)
+        if breaker is None:
+            breaker = cls._breakers[host] = CircuitBreaker(host)
+        return breaker
+
+    @classmethod
+    def all_stats(cls):
+        return {host: breaker.stats() for host, breaker in cls._breakers.items()}
+
+    def __init__(self, host):
+        self.host = host
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_until = 0
+        self.timeout = self.reset_timeout
+        self.probing = False
+        self.probe_started = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self):
+        return self.state == OPEN and time.monotonic() < self.opened_until
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now >= self.opened_until:
+            self.state = HALF_OPEN
+            self.probing = False
+        # 探测请求被取消时不会有结果，超时后允许再探测一次
+        if self.state == HALF_OPEN and (
+            not self.probing or now - self.probe_started > self.timeout
+        ):
+            self.probing = True
+            self.probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+        self.timeout = self.reset_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.timeout = min(self.timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.probing = False
+        self.opened_until = time.monotonic() + self.timeout
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": max(0, round(self.opened_until - time.monotonic(), 1)),
+            "rejected": self.rejected,
+        }
+
+
+class Backoff:
+    """
+    指数退避 + full jitter：第n次重试前等待 [0, min(cap, base * 2^n)) 秒
+    """
+
+    base = 0.5  # seconds
+    cap = 10  # seconds
+
+    @classmethod
+    def initialize(cls, config):
+        cls.base = config.get("backoff_base", cls.base)
+        cls.cap = config.get("backoff_cap", cls.cap)
+
+    @classmethod
+    def delay(cls, attempt):
+        return random.uniform(0, min(cls.cap, cls.base * 2**attempt))
@@ -0,0 +1,132 @@
+import threading
+from io import BytesIO
+from math import cos, radians, sin
+from typing import Any, NamedTuple
+
+import cairosvg
+from PIL import Image
+
+FACE_SVG = """
+<!-- 圆圈 -->
+<circle cx="0" cy="0" r="90" fill="none" stroke="white" stroke-width="6" />
+
+<!-- 整点标记 -->
+<line x1="0" y1="-90" x2="0" y2="-80" stroke="white" stroke-width="4" />
+<line x1="45" y1="-77.94" x2="40" y2="-69.28" stroke="white" stroke-width="4" />
+<line x1="77.94" y1="-45" x2="69.28" y2="-40" stroke="white" stroke-width="4" />
+<line x1="90" y1="0" x2="80" y2="0" stroke="white" stroke-width="4" />
+<line x1="77.94" y1="45" x2="69.28" y2="40" stroke="white" stroke-width="4" />
+<line x1="45" y1="77.94" x2="40" y2="69.28" stroke="white" stroke-width="4" />
+<line x1="0" y1="90" x2="0" y2="80" stroke="white" stroke-width="4" />
+<line x1="-45" y1="77.94" x2="-40" y2="69.28" stroke="white" stroke-width="4" />
+<line x1="-77.94" y1="45" x2="-69.28" y2="40" stroke="white" stroke-width="4" />
+<line x1="-90" y1="0" x2="-80" y2="0" stroke="white" stroke-width="4" />
+<line x1="-77.94" y1="-45" x2="-69.28" y2="-40" stroke="white" stroke-width="4" />
+<line x1="-45" y1="-77.94" x2="-40" y2="-69.28" stroke="white" stroke-width="4" />
+"""
+
+CAP_SVG = '<circle cx="0" cy="0" r="4" fill="black" />'
+
+
+class Hand(NamedTuple):
+    length: int
+    width: int
+    color: str
+    positions: int
+
+
+HOUR_HAND = Hand(40, 6, "white", 720)  # 每12小时720个位置，即每分钟一格
+MINUTE_HAND = Hand(60, 4, "white", 60)
+SECOND_HAND = Hand(80, 2, "yellow", 60)
+
+
+def hand_svg(hand, position):
+    angle = 360 * position / hand.positions
+    x = hand.length * sin(radians(angle))
+    y = -hand.length * cos(radians(angle))
+    return f'<line x1="0" y1="0" x2="{x}" y2="{y}" stroke="{hand.color}" stroke-width="{hand.width}" />'
+
+
+def svg_document(body, width=200, height=200):
+    return (
+        f'<svg width="{width}" height="{height}" viewBox="-100 -100 200 200" '
+        f'xmlns="http://www.w3.org/2000/svg">{body}</svg>'
+    )
+
+
+def rasterize(body, size):
+    w, h = size
+    png_data = cairosvg.svg2png(bytestring=svg_document(body, w, h))
+    return Image.open(BytesIO(png_data)).convert("RGBA")
+
+
+class Sprite(NamedTuple):
+    offset: tuple
+    image: Any
+
+
+def make_sprite(body, size):
+    # 只保留非透明区域，图集内存按指针的包围盒计算，而不是整张按键
+    image = rasterize(body, size)
+    bbox = image.getbbox() or (0, 0, 1, 1)
+    return Sprite(bbox[:2], image.crop(bbox))
+
+
+class ClockFace:
+    """
+    按按键原生尺寸渲染时钟：静态表盘只栅格化一次，三根指针从图集里取出后alpha合成。
+    图集按需填充，同一尺寸的多个时区时钟共用一份；事件循环和渲染线程都会调用，填充时加锁
+    """
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.face = rasterize(FACE_SVG, self.size)
+        self.cap = make_sprite(CAP_SVG, self.size)
+        self._atlas = {
+            hand: [None] * hand.positions
+            for hand in (HOUR_HAND, MINUTE_HAND, SECOND_HAND)
+        }
+        self._lock = threading.Lock()
+
+    def sprite(self, hand, position):
+        sprites = self._atlas[hand]
+        sprite = sprites[position]
+        if sprite is None:
+            with self._lock:
+                sprite = sprites[position]
+                if sprite is None:
+                    sprite = sprites[position] = make_sprite(
+                        hand_svg(hand, position), self.size
+                    )
+        return sprite
+
+    def warm(self):
+        for hand, sprites in self._atlas.items():
+            for position in range(hand.positions):
+                self.sprite(hand, position)
+
+    def render(self, hour, minute, second):
+        image = self.face.copy()
+        for sprite in (
+            self.sprite(HOUR_HAND, (hour % 12) * 60 + minute),
+            self.sprite(MINUTE_HAND, minute),
+            self.sprite(SECOND_HAND, second),
+            self.cap,
+        ):
+            image.alpha_composite(sprite.image, dest=sprite.offset)
+        return image
+
+
+_faces = {}
+_faces_lock = threading.Lock()
+
+
+def clock_face(size):
+    size = tuple(size)
+    face = _faces.get(size)
+    if face is None:
+        with _faces_lock:
+            face = _faces.get(size)
+            if face is None:
+                face = _faces[size] = ClockFace(size)
+    return face
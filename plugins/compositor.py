@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from plugins.key_writer import key_writer
+
+
+class Compositor:
+    """
+    每个设备一个合成器，统一负责写按键图片：插件只提交帧，合成器按固定节拍刷新脏按键，
+    每拍最多写 writes_per_tick 个；按键反馈走 urgent，立即写入不排队
+    """
+
+    tick = 0.05  # 秒
+    writes_per_tick = 6
+
+    @classmethod
+    def initialize(cls, config):
+        cls.tick = config.get("tick_ms", cls.tick * 1000) / 1000
+        cls.writes_per_tick = config.get("writes_per_tick", cls.writes_per_tick)
+
+    def __init__(self, deck):
+        self.deck = deck
+        self._dirty = OrderedDict()  # key -> (native, digest)，重复提交保留原来的排队位置
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self.submitted = 0
+        self.coalesced = 0
+        self.urgent = 0
+        self.flushed = 0
+        self.max_backlog = 0
+        self.press_latency = deque(maxlen=256)  # 秒，最近的按键到写入完成耗时
+
+    def submit(self, key, native, digest=None, urgent=False, since=None):
+        """
+        since: 按键事件到达时的 time.perf_counter()，用于统计按键到像素的延迟
+        """
+        self.submitted += 1
+        if urgent:
+            self.urgent += 1
+            # 按键反馈由该按键最新的帧生成，排队中的旧帧不再需要，否则下一拍会覆盖按下效果
+            if self._dirty.pop(key, None) is not None:
+                self.coalesced += 1
+            self._write(key, native, digest)
+            if since is not None:
+                self.press_latency.append(time.perf_counter() - since)
+            return
+        if key in self._dirty:
+            self.coalesced += 1
+        self._dirty[key] = (native, digest)
+        self.max_backlog = max(self.max_backlog, len(self._dirty))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环里（例如启动阶段），直接写
+            self.flush()
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def flush(self, limit=None):
+        count = 0
+        while self._dirty and (limit is None or count < limit):
+            key, (native, digest) = self._dirty.popitem(last=False)
+            self._write(key, native, digest)
+            count += 1
+        return count
+
+    def _write(self, key, native, digest):
+        try:
+            if key_writer.write(self.deck, key, native, digest):
+                self.flushed += 1
+        except Exception as e:
+            print(f"Failed to write key {key}:", e)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._dirty:
+                # 等到下一拍再写，让同一时刻的一批提交合并
+                await asyncio.sleep(self.tick)
+                self.flush(self.writes_per_tick)
+
+    def clear(self):
+        self._dirty.clear()
+
+    def close(self):
+        self.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def latency_stats(self):
+        samples = sorted(self.press_latency)
+        if not samples:
+            return {"count": 0}
+        return {
+            "count": len(samples),
+            "p50_ms": samples[len(samples) // 2] * 1000,
+            "p95_ms": samples[int(len(samples) * 0.95)] * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+
+    def stats(self):
+        return {
+            "tick_ms": self.tick * 1000,
+            "writes_per_tick": self.writes_per_tick,
+            "backlog": len(self._dirty),
+            "max_backlog": self.max_backlog,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "urgent": self.urgent,
+            "flushed": self.flushed,
+            "press_latency": self.latency_stats(),
+        }
+
+
+_compositors = {}
+
+
+def compositor_for(deck):
+    compositor = _compositors.get(id(deck))
+    if compositor is None:
+        compositor = _compositors[id(deck)] = Compositor(deck)
+    return compositor
+
+
+def compositor_stats():
+    return {
+        f"{c.deck.__class__.__name__}-{i}": c.stats()
+        for i, c in enumerate(_compositors.values())
+    }
@@ -3,10 +3,9 @@ import logging
 from typing import Any
 
 import dingtalk_stream
-import pandas as pd
 from dingtalk_stream import AckMessage
-from dingtalkchatbot.chatbot import DingtalkChatbot
 
+from .executor import blocking_executor
 from .plugin import StreamDeckPlugin
 from .serpapi_plugin import SerpAPIPlugin
 
@@ -27,13 +26,23 @@ class EchoMarkdownHandler(dingtalk_stream.ChatbotHandler):
         self.plugin.image = self.plugin.on_image
         self.plugin.update_screen(self.deck)
 
+        # SerpAPI和钉钉回复都是同步HTTP请求，放到线程池里，不阻塞按键和接口
         if text.startswith("/google"):
             query = text.replace("/google", "").strip()
-            text_blocks = SerpAPIPlugin.search(query)
-            result = SerpAPIPlugin.parse_text_blocks(text_blocks)
-            self.reply_markdown(query, result, self.incoming_message)
+            try:
+                text_blocks = await blocking_executor.run(
+                    "serpapi.search", SerpAPIPlugin.search, query
+                )
+                result = SerpAPIPlugin.parse_text_blocks(text_blocks)
+            except Exception as e:
+                result = f"搜索失败: {e!r}"
+            await blocking_executor.run(
+                "dingtalk.reply", self.reply_markdown, query, result, self.incoming_message
+            )
         else:
-            self.reply_markdown("title", text, self.incoming_message)
+            await blocking_executor.run(
+                "dingtalk.reply", self.reply_markdown, "title", text, self.incoming_message
+            )
 
         return AckMessage.STATUS_OK, "OK"
 
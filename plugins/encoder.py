@@ -0,0 +1,79 @@
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+from plugins.render_cache import LRUCache, key_geometry
+
+encode_cache = LRUCache(max_bytes=4 * 1024 * 1024)
+
+
+class NativeEncoder:
+    """
+    把PIL图片转换为设备原生格式（JPEG/BMP + 旋转/翻转），结果按源图片摘要缓存。
+    编码参数按设备型号在config.json的encoder中配置，例如:
+        "encoder": {"streamdock": {"quality": 90, "subsampling": 0, "optimize": false}}
+    型号可以写设备类名（如StreamDeckXL）或设备族（streamdeck / streamdock）
+    """
+
+    settings = {}
+
+    @classmethod
+    def initialize(cls, config):
+        cls.settings = config.get("encoder", {})
+        cache_bytes = config.get("encode_cache", {}).get("max_bytes")
+        if cache_bytes:
+            encode_cache.configure(cache_bytes)
+
+    @classmethod
+    def params_for(cls, deck):
+        family = "streamdock" if deck.__module__.startswith("StreamDock") else "streamdeck"
+        return cls.settings.get(deck.__class__.__name__) or cls.settings.get(family)
+
+    @classmethod
+    def encode(cls, deck, image):
+        params = cls.params_for(deck)
+        h = hashlib.blake2b(image.tobytes(), digest_size=16)
+        h.update(repr((image.mode, image.size, key_geometry(deck), params)).encode())
+        key = h.digest()
+        native = encode_cache.get(key)
+        if native is None:
+            if params and hasattr(deck, "key_image_format"):
+                native = _encode(image, deck.key_image_format(), params)
+            else:
+                native = pil_helper(deck).to_native_key_format(deck, image)
+            encode_cache.put(key, native)
+        return native
+
+
+def _encode(image, image_format, params):
+    # 与SDK中PILHelper.to_native_key_format的变换一致，只是编码参数可调
+    if image_format["size"] != image.size:
+        image = image.resize(image_format["size"])
+    if image_format["rotation"]:
+        image = image.rotate(image_format["rotation"])
+    if image_format["flip"][0]:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    if image_format["flip"][1]:
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+
+    buffer = BytesIO()
+    if image_format["format"].upper() == "JPEG":
+        image.convert("RGB").save(
+            buffer,
+            "JPEG",
+            quality=params.get("quality", 100),
+            subsampling=params.get("subsampling", -1),
+            optimize=params.get("optimize", False),
+        )
+    else:
+        image.save(buffer, image_format["format"])
+    return buffer.getvalue()
+
+
+def pil_helper(deck):
+    if deck.__module__.startswith("StreamDock"):
+        from StreamDock.ImageHelpers import PILHelper
+    else:
+        from StreamDeck.ImageHelpers import PILHelper
+    return PILHelper
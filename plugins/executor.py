@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("asyncio")
+
+
+class BlockingExecutor:
+    """
+    同步SDK调用（SerpAPI、Uptime Kuma 的 socket.io、钉钉机器人）统一放到有界线程池执行，
+    不阻塞事件循环。每次调用带超时，调用方取消时未开始的任务不再执行；
+    按调用点（site）统计次数、超时、错误以及原本会阻塞事件循环的时间
+    """
+
+    max_workers = 4
+    timeout = 30  # seconds
+
+    def __init__(self):
+        self._executor = None
+        self._stats = {}  # site -> dict
+        self._running = 0
+
+    def initialize(self, config):
+        max_workers = config.get("max_workers", self.max_workers)
+        self.timeout = config.get("timeout", self.timeout)
+        if max_workers != self.max_workers:
+            self.shutdown()
+            self.max_workers = max_workers
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="blocking"
+            )
+        return self._executor
+
+    def _site(self, site):
+        stat = self._stats.get(site)
+        if stat is None:
+            stat = self._stats[site] = {
+                "calls": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "cancelled": 0,
+                "blocking_seconds": 0.0,
+                "max_seconds": 0.0,
+                "queue_seconds": 0.0,
+            }
+        return stat
+
+    async def run(self, site, func, *args, timeout=None, **kwargs):
+        """
+        在线程池中执行 func(*args, **kwargs) 并等待结果。
+        超时抛出 TimeoutError；线程里已经开始的调用无法中断，会在后台跑完，结果被丢弃
+        """
+        stat = self._site(site)
+        stat["calls"] += 1
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            stat["queue_seconds"] += started - submitted
+            self._running += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._running -= 1
+                elapsed = time.perf_counter() - started
+                stat["blocking_seconds"] += elapsed
+                stat["max_seconds"] = max(stat["max_seconds"], elapsed)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), call)
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            stat["timeouts"] += 1
+            logger.error(f"{site} timed out after {timeout or self.timeout}s")
+            raise
+        except asyncio.CancelledError:
+            stat["cancelled"] += 1
+            raise
+        except Exception:
+            stat["errors"] += 1
+            raise
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "running": self._running,
+            "sites": {
+                site: {
+                    **stat,
+                    "avg_seconds": stat["blocking_seconds"] / stat["calls"]
+                    if stat["calls"]
+                    else 0.0,
+                }
+                for site, stat in self._stats.items()
+            },
+        }
+
+
+blocking_executor = BlockingExecutor()
@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger("asyncio")
+
+# 为True时，过期的值直接返回并在后台刷新；按键事件里设置，用户操作不等网络
+stale_ok = contextvars.ContextVar("stale_ok", default=False)
+# 调用方放一个列表进来，返回旧值时把后台刷新的任务加进去，刷新完成后可以重绘
+revalidations = contextvars.ContextVar("revalidations", default=None)
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "stale_until")
+
+    def __init__(self, value, expires, stale_until):
+        self.value = value
+        self.expires = expires
+        self.stale_until = stale_until
+
+
+class FetchCache:
+    """
+    DataFetcher的请求缓存：
+    - 同一请求的并发未命中只发一次（single-flight），其余调用共享结果
+    - 过期后在stale窗口内可以先返回旧值，同时后台刷新（stale-while-revalidate）
+    - 失败结果（空值）只缓存 negative_ttl 秒；已有旧值时继续提供旧值
+    """
+
+    negative_ttl = 5  # seconds
+    max_stale = 3600  # seconds
+    max_entries = 512
+
+    def __init__(self):
+        self._entries = {}
+        self._inflight = {}
+        self.on_store = None  # (key, value, 过期的墙上时间) -> None，用于持久化
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.negative = 0
+
+    @classmethod
+    def initialize(cls, config):
+        cls.negative_ttl = config.get("negative_ttl", cls.negative_ttl)
+        cls.max_stale = config.get("max_stale", cls.max_stale)
+        cls.max_entries = config.get("max_entries", cls.max_entries)
+
+    async def get(self, key, fetch, ttl):
+        """
+        fetch: 无参数的协程函数，返回要缓存的值；ttl<=0 表示不使用缓存，但仍合并并发请求
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and ttl > 0:
+            if now < entry.expires:
+                self.hits += 1
+                return entry.value
+            if entry.value and now < entry.stale_until and stale_ok.get():
+                self.stale_hits += 1
+                task = self._refresh(key, fetch, ttl)
+                pending = revalidations.get()
+                if pending is not None:
+                    pending.append(task)
+                return entry.value
+        self.misses += 1
+        # shield：调用方被取消时不影响其它共享这次请求的调用方
+        return await asyncio.shield(self._refresh(key, fetch, ttl))
+
+    def _refresh(self, key, fetch, ttl):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(key, fetch, ttl))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return task
+
+    async def _load(self, key, fetch, ttl):
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if value:
+            if ttl > 0:
+                self._entries[key] = _Entry(value, now + ttl, now + ttl + self.max_stale)
+                if self.on_store:
+                    self.on_store(key, value, time.time() + ttl)
+        else:
+            self.negative += 1
+            if entry and entry.value:
+                # 上游失败时保留旧值，稍后再试
+                entry.expires = now + self.negative_ttl
+                return entry.value
+            if ttl > 0:
+                self._entries[key] = _Entry(value, now + self.negative_ttl, now)
+        self._prune(now)
+        return value
+
+    def restore(self, key, value, expires):
+        """
+        从持久化存储恢复，expires 是墙上时间；已过期的值留作stale
+        """
+        now = time.monotonic()
+        remaining = expires - time.time()
+        self._entries[key] = _Entry(
+            value, now + remaining, now + max(remaining, 0) + self.max_stale
+        )
+
+    def _prune(self, now):
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [k for k, e in self._entries.items() if e.stale_until <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "negative": self.negative,
+        }
+
+
+fetch_cache = FetchCache()
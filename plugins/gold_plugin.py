@@ -1,7 +1,8 @@
 from .plugin import StreamDeckPlugin
-import asyncio
 import datetime
 
+GOLD_URL = "https://api.jisuapi.com/gold/storegold"
+
 class GoldPlugin(StreamDeckPlugin):
     key_up_count: int = 0    
     app_key: str = ""
@@ -12,11 +13,10 @@ class GoldPlugin(StreamDeckPlugin):
     
     async def fetch_data(self):
         yesterday = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime('%Y-%m-%d')        
-        url = f'https://api.jisuapi.com/gold/storegold?appkey={self.app_key}&date={yesterday}'
+        url = f'{GOLD_URL}?appkey={self.app_key}&date={yesterday}'
         return await self.async_fetch_data(url)
 
-    async def update_deck(self, deck):
-        self.update_screen(deck)
+    async def prefetch(self):
         data = await self.fetch_data()
         if data:
             # print(data)
@@ -27,19 +27,23 @@ class GoldPlugin(StreamDeckPlugin):
                 first_item = result[7] if result else None
             if first_item:
                 self.title = f"{first_item['gold']}\n\n昨日金价\n{first_item['store_name']}"
+        elif self.upstream_down(GOLD_URL):
+            self.title = "\nUpstream\nDown"
+        return data
+
+    async def update_deck(self, deck):
+        self.show_placeholder(deck)
+        # 没有数据但熔断器打开时也要重绘，显示 Upstream Down
+        if await self.prefetch() or self.upstream_down(GOLD_URL):
             self.update_screen(deck)
 
-    async def run(self, deck):
-        while not self.stop:
-            await self.update_deck(deck)
-            await asyncio.sleep(self.interval)
-            
     async def on_will_appear(self, deck) -> None:
-        self.update_screen(deck)
-        await self.run(deck)
+        await super().on_will_appear(deck)
+        self.show_placeholder(deck)
+        self.schedule(deck, self.update_deck)
 
     async def on_will_disappear(self, deck) -> None:
-        pass
+        await super().on_will_disappear(deck)
 
     async def on_key_up(self, deck) -> None:
         self.key_up_count = self.key_up_count + 1
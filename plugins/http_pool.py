@@ -0,0 +1,108 @@
+import asyncio
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger("asyncio")
+
+
+class HttpClientPool:
+    """
+    长连接的httpx客户端池，按(proxy, auth, headers)复用，避免每次请求都重新建TCP/TLS（以及SOCKS）连接。
+    全局和每个host的并发请求数由信号量限制，进程退出时在FastAPI lifespan里统一关闭
+    """
+
+    http2 = False
+    max_connections = 20
+    max_keepalive_connections = 10
+    keepalive_expiry = 60  # seconds
+    max_connections_per_host = 4
+    max_concurrent_requests = 16
+
+    _clients = {}
+    _host_limits = {}
+    _global_limit = None
+
+    @classmethod
+    def initialize(cls, config):
+        cls.http2 = config.get("http2", cls.http2)
+        if cls.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("http2 requires the h2 package, falling back to HTTP/1.1")
+            cls.http2 = False
+        cls.max_connections = config.get("max_connections", cls.max_connections)
+        cls.max_keepalive_connections = config.get(
+            "max_keepalive_connections", cls.max_keepalive_connections
+        )
+        cls.keepalive_expiry = config.get("keepalive_expiry", cls.keepalive_expiry)
+        cls.max_connections_per_host = config.get(
+            "max_connections_per_host", cls.max_connections_per_host
+        )
+        cls.max_concurrent_requests = config.get(
+            "max_concurrent_requests", cls.max_concurrent_requests
+        )
+
+    @classmethod
+    def get_client(cls, proxy=None, auth=None, headers=None):
+        key = (proxy or None, auth, tuple(sorted((headers or {}).items())))
+        client = cls._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                headers=headers,
+                auth=auth,
+                proxy=proxy or None,
+                http2=cls.http2,
+                limits=httpx.Limits(
+                    max_connections=cls.max_connections,
+                    max_keepalive_connections=cls.max_keepalive_connections,
+                    keepalive_expiry=cls.keepalive_expiry,
+                ),
+            )
+            cls._clients[key] = client
+        return client
+
+    @classmethod
+    def host_limit(cls, url):
+        host = urlsplit(str(url)).netloc
+        limit = cls._host_limits.get(host)
+        if limit is None:
+            limit = cls._host_limits[host] = asyncio.Semaphore(
+                cls.max_connections_per_host
+            )
+        return limit
+
+    @classmethod
+    @asynccontextmanager
+    async def limit(cls, url):
+        if cls._global_limit is None:
+            cls._global_limit = asyncio.Semaphore(cls.max_concurrent_requests)
+        async with cls._global_limit, cls.host_limit(url):
+            yield
+
+    @classmethod
+    async def aclose(cls):
+        clients = list(cls._clients.values())
+        cls._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Failed to close http client: {e}")
+
+    @classmethod
+    def stats(cls):
+        return {
+            "clients": len(cls._clients),
+            "http2": cls.http2,
+            "in_flight": (
+                cls.max_concurrent_requests - cls._global_limit._value
+                if cls._global_limit
+                else 0
+            ),
+            "hosts": {
+                host: cls.max_connections_per_host - limit._value
+                for host, limit in cls._host_limits.items()
+            },
+        }
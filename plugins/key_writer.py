@@ -0,0 +1,46 @@
+import hashlib
+
+
+def digest_of(native):
+    return hashlib.blake2b(native, digest_size=16).digest()
+
+
+class KeyWriter:
+    """
+    按键图片写入的去重层：记录每个按键最后一次发送的原生字节摘要，内容没变就不再走USB
+    """
+
+    def __init__(self):
+        self._last_sent = {}  # (id(deck), key) -> digest
+        self.writes = 0
+        self.suppressed = 0
+
+    def write(self, deck, key, native, digest=None):
+        if digest is None:
+            digest = digest_of(native)
+        slot = (id(deck), key)
+        if self._last_sent.get(slot) == digest:
+            self.suppressed += 1
+            return False
+        deck.set_key_image(key, native)
+        self._last_sent[slot] = digest
+        self.writes += 1
+        return True
+
+    # 设备被清屏/重置后，已记录的摘要不再可信
+    def invalidate(self, deck=None, key=None):
+        if deck is None:
+            self._last_sent.clear()
+            return
+        for slot in list(self._last_sent):
+            if slot[0] == id(deck) and (key is None or slot[1] == key):
+                del self._last_sent[slot]
+
+    def stats(self):
+        return {
+            "writes": self.writes,
+            "suppressed": self.suppressed,
+        }
+
+
+key_writer = KeyWriter()
@@ -0,0 +1,144 @@
+import asyncio
+
+from PIL import Image, ImageDraw
+
+TEXT_COLOR = (255, 255, 255)
+FPS = 20
+STEP = 2  # 每帧移动像素
+GAP = 20  # 首尾相接时的间隔像素
+
+
+class MarqueeStrip:
+    """
+    一行文字只栅格化一次，画成 [文字+间隔][文字...] 的长条，每帧只需要按偏移裁剪
+    """
+
+    def __init__(self, line, font, key_width, background, color=TEXT_COLOR):
+        bbox = font.getbbox(line)  # 返回 (x0, y0, x1, y1)
+        self.text_width = bbox[2] - bbox[0]
+        self.height = font.size
+        self.key_width = key_width
+        self.scrolls = self.text_width > key_width
+        self.period = self.text_width + GAP if self.scrolls else 1
+
+        width = self.period + key_width if self.scrolls else key_width
+        self.image = Image.new("RGB", (width, self.height), color=background)
+        draw = ImageDraw.Draw(self.image)
+        draw.text((0, 0), line, font=font, fill=color)
+        if self.scrolls:
+            draw.text((self.period, 0), line, font=font, fill=color)
+
+    def crop(self, offset):
+        x = offset % self.period
+        return self.image.crop((x, 0, x + self.key_width, self.height))
+
+
+class Marquee:
+    def __init__(self, lines, size, font, background="black", step=STEP):
+        self.size = tuple(size)
+        self.background = background
+        self.step = step
+        self.tick = 0
+        self.strips = [
+            MarqueeStrip(line, font, self.size[0], background) for line in lines
+        ]
+
+    @property
+    def scrolling(self):
+        return any(strip.scrolls for strip in self.strips)
+
+    def next_frame(self):
+        image = Image.new("RGB", self.size, color=self.background)
+        offset = self.tick * self.step
+        y = 0
+        for strip in self.strips:
+            if y >= self.size[1]:
+                break
+            image.paste(strip.crop(offset), (0, y))
+            y += strip.height
+        self.tick += 1
+        return image
+
+
+class _Running:
+    __slots__ = ("deck", "marquee", "interval", "due")
+
+    def __init__(self, deck, marquee, interval, due):
+        self.deck = deck
+        self.marquee = marquee
+        self.interval = interval
+        self.due = due
+
+
+class MarqueeScheduler:
+    """
+    所有跑马灯按键共用一个asyncio帧调度任务，各自按FPS推进，来不及时跳帧而不是堆积
+    """
+
+    def __init__(self, fps=FPS):
+        self.fps = fps
+        self._running = {}  # (id(deck), key) -> _Running
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def configure(self, fps):
+        self.fps = fps
+
+    def start(self, deck, marquee, fps=None):
+        """
+        deck是StreamDeck按键对象，需要提供write_image(image)
+        """
+        slot = (id(deck.deck), deck.key)
+        if not marquee.scrolling:
+            # 所有行都放得下，画一帧就够了
+            self._running.pop(slot, None)
+            deck.write_image(marquee.next_frame())
+            return
+
+        loop = asyncio.get_running_loop()
+        self._running[slot] = _Running(deck, marquee, 1 / (fps or self.fps), loop.time())
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def stop(self, deck):
+        self._running.pop((id(deck.deck), deck.key), None)
+
+    def stop_all(self):
+        self._running.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def is_running(self, deck):
+        return (id(deck.deck), deck.key) in self._running
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._running:
+            now = loop.time()
+            for running in list(self._running.values()):
+                if running.due > now:
+                    continue
+                try:
+                    running.deck.write_image(running.marquee.next_frame())
+                except Exception as e:
+                    print("Error in marquee:", e)
+                    self.stop(running.deck)
+                running.due += running.interval
+                if running.due < now:
+                    running.due = now + running.interval
+            if not self._running:
+                break
+            delay = min(r.due for r in self._running.values()) - loop.time()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {"fps": self.fps, "running": len(self._running)}
+
+
+marquee_scheduler = MarqueeScheduler()
@@ -0,0 +1,220 @@
+import threading
+from array import array
+
+
+class History:
+    """
+    最近 size 次心跳的环形缓冲区：ping 和状态分别存放在定长的 array 里，
+    每个采样只占5个字节，不创建Python对象；几百个监控也只需要几百KB
+    """
+
+    __slots__ = ("ping", "status", "head", "count")
+    size = 36
+
+    def __init__(self):
+        self.ping = array("f", bytes(4 * self.size))
+        self.status = array("b", bytes(self.size))
+        self.head = 0  # 下一次写入的位置
+        self.count = 0
+
+    def append(self, ping, status):
+        self.ping[self.head] = ping
+        self.status[self.head] = status
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def copy(self):
+        history = History.__new__(History)
+        history.ping = array("f", self.ping)
+        history.status = array("b", self.status)
+        history.head = self.head
+        history.count = self.count
+        return history
+
+
+class Monitor:
+    """
+    单个监控项的最新状态：监控配置 + 24h/720h 可用率 + 最近一次心跳
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "active",
+        "parent",
+        "uptime_in_24",
+        "uptime_in_720",
+        "status",
+        "msg",
+        "ping",
+        "down_count",
+        "history",
+    )
+
+    def __init__(self, id):
+        self.id = id
+        self.name = ""
+        self.active = False
+        self.parent = None
+        self.uptime_in_24 = 0.0
+        self.uptime_in_720 = 0.0
+        self.status = 0  # 没有心跳时按DOWN处理，和原来 fillna(0) 的结果一致
+        self.msg = ""
+        self.ping = 0
+        self.down_count = 0
+        self.history = History()
+
+    @property
+    def is_ok(self):
+        return self.active and self.status == 1
+
+    @property
+    def is_error(self):
+        return self.active and self.status == 0
+
+
+class MonitorStore:
+    """
+    按监控id索引的内存存储，替代每次轮询重建、每次请求过滤的 pandas DataFrame：
+    - get(id) 是一次字典查找
+    - 正常/异常数量和异常列表随每次更新增量维护，汇总时不需要扫描全部监控
+    - version 在任何变化后递增，便于上层按数据版本缓存计算结果
+    数据由拉取线程写入、事件循环读取，写操作加锁
+    """
+
+    def __init__(self):
+        self._monitors = {}  # id -> Monitor
+        self._errors = set()  # 异常监控的id
+        self.ok_count = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._monitors)
+
+    def __bool__(self):
+        return bool(self._monitors)
+
+    def get(self, id):
+        return self._monitors.get(id)
+
+    def values(self):
+        return list(self._monitors.values())
+
+    def history(self, id):
+        # 拉取线程可能正在写入，返回一份副本给渲染使用
+        with self._lock:
+            monitor = self._monitors.get(id)
+            return monitor.history.copy() if monitor is not None else None
+
+    @property
+    def err_count(self):
+        return len(self._errors)
+
+    def first_error(self):
+        with self._lock:
+            if not self._errors:
+                return None
+            return self._monitors[min(self._errors)]
+
+    def replace_all(self, monitors, uptimes, heartbeats):
+        """
+        用一次完整拉取（get_monitors / uptime / get_heartbeats）的结果重建全部状态
+        """
+        with self._lock:
+            self._monitors = {}
+            self._errors = set()
+            self.ok_count = 0
+            for item in monitors:
+                self._set_monitor(item)
+            for id, item in uptimes.items():
+                self._set_uptime(id, item)
+            for id, items in heartbeats.items():
+                if items:
+                    # 心跳列表按时间排序后写入历史，最新一条作为当前状态
+                    for heartbeat in sorted(items, key=lambda x: x.get("time") or "")[
+                        -History.size :
+                    ]:
+                        self._set_heartbeat(id, heartbeat)
+            self.version += 1
+
+    def update_monitor(self, item):
+        with self._lock:
+            self._set_monitor(item)
+            self.version += 1
+
+    def replace_monitors(self, items):
+        """
+        用完整的监控列表（monitorList推送）更新配置，删除已经不存在的监控
+        """
+        with self._lock:
+            ids = set()
+            for item in items:
+                self._set_monitor(item)
+                ids.add(item["id"])
+            for id in [id for id in self._monitors if id not in ids]:
+                self._count(self._monitors.pop(id), -1)
+            self.version += 1
+
+    def remove_monitor(self, id):
+        with self._lock:
+            monitor = self._monitors.pop(id, None)
+            if monitor is not None:
+                self._count(monitor, -1)
+                self.version += 1
+
+    def update_uptime(self, id, item):
+        with self._lock:
+            self._set_uptime(id, item)
+            self.version += 1
+
+    def update_heartbeat(self, id, heartbeat):
+        with self._lock:
+            self._set_heartbeat(id, heartbeat)
+            self.version += 1
+
+    def _monitor(self, id):
+        monitor = self._monitors.get(id)
+        if monitor is None:
+            monitor = self._monitors[id] = Monitor(id)
+        return monitor
+
+    def _count(self, monitor, sign):
+        if monitor.is_ok:
+            self.ok_count += sign
+        elif monitor.is_error:
+            if sign > 0:
+                self._errors.add(monitor.id)
+            else:
+                self._errors.discard(monitor.id)
+
+    def _set_monitor(self, item):
+        monitor = self._monitor(item["id"])
+        self._count(monitor, -1)
+        monitor.name = item.get("name", "")
+        monitor.active = bool(item.get("active"))
+        monitor.parent = item.get("parent")
+        self._count(monitor, 1)
+
+    def _set_uptime(self, id, item):
+        monitor = self._monitor(id)
+        monitor.uptime_in_24 = item.get(24, monitor.uptime_in_24)
+        monitor.uptime_in_720 = item.get(720, monitor.uptime_in_720)
+
+    def _set_heartbeat(self, id, heartbeat):
+        monitor = self._monitor(id)
+        self._count(monitor, -1)
+        monitor.status = int(heartbeat.get("status") or 0)
+        monitor.msg = heartbeat.get("msg") or ""
+        monitor.ping = heartbeat.get("ping") or 0
+        monitor.down_count = heartbeat.get("down_count") or 0
+        monitor.history.append(monitor.ping, monitor.status)
+        self._count(monitor, 1)
+
+    def stats(self):
+        return {
+            "monitors": len(self._monitors),
+            "ok": self.ok_count,
+            "err": self.err_count,
+            "version": self.version,
+        }
@@ -18,16 +18,10 @@ class NextPagePlugin(StreamDeckPlugin):
         self.update_screen(deck)
 
     async def on_key_double_click(self, deck) -> None:
-        url = f'{self.base_data_url()}/admin/lcd_off'
-        await self.async_fetch_data(url)
+        await self.call("admin.lcd_off")
         self.title=""
         self.update_screen(deck)
     
     async def on_key_up(self, deck) -> None:
-        if self.prev:
-            url = f'{self.base_data_url()}/admin/prev'
-        else:
-            url = f'{self.base_data_url()}/admin/next'
-        await self.async_fetch_data(url)
-        self.title=""
-        self.update_screen(deck)
+        # 翻页后这个按键属于新页面，由新页面的插件负责绘制
+        await self.call("admin.prev" if self.prev else "admin.next")
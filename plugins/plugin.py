@@ -1,17 +1,31 @@
+import abc
 import asyncio
+import hashlib
+import inspect
+import json
 import logging
+import time
+import weakref
 from typing import Any, ClassVar, List, Optional
 
 import httpx
-from aiocache import Cache, cached
 from pydantic import BaseModel, ValidationError
 from pydantic.fields import Field
 
+from plugins.bus import bus
+from plugins.circuit_breaker import Backoff, CircuitBreaker
+from plugins.fetch_cache import fetch_cache, revalidations, stale_ok
+from plugins.http_pool import HttpClientPool
+from plugins.scheduler import poll_scheduler
 from plugins.streamdeck import StreamDeck
+from plugins.validators import fetch_stats, validators
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("asyncio")
 
+# 持有异步渲染任务的引用，避免任务在完成前被回收
+_render_tasks = set()
+
 
 class TemplateRender:
     def render(template_path: str, context: dict):
@@ -56,7 +70,6 @@ class TemplateRender:
 
 class DataFetcher:
     @staticmethod
-    @cached(cache=Cache.MEMORY, ttl=60, namespace="main")
     async def async_fetch_data(
         url,
         post_data=None,
@@ -66,29 +79,96 @@ class DataFetcher:
         max_retries=2,
         proxy=None,
         auth=None,
+        ttl=60,
+        source=None,
+    ):
+        # key会被持久化到磁盘，不能直接包含token等敏感信息
+        key = hashlib.blake2b(
+            repr((url, post_data, query_params, headers, proxy, auth)).encode(),
+            digest_size=16,
+        ).hexdigest()
+        fetch_stats.call(source)
+        return await fetch_cache.get(
+            key,
+            lambda: DataFetcher._fetch(
+                key,
+                url,
+                post_data,
+                query_params,
+                headers,
+                timeout,
+                max_retries,
+                proxy,
+                auth,
+                source,
+            ),
+            ttl,
+        )
+
+    @staticmethod
+    async def _fetch(
+        key,
+        url,
+        post_data,
+        query_params,
+        headers,
+        timeout,
+        max_retries,
+        proxy,
+        auth,
+        source,
     ):
         retries = 0
         # print(url, "timeout .....", timeout)
+        breaker = CircuitBreaker.for_url(url)
+        client = HttpClientPool.get_client(proxy=proxy, auth=auth, headers=headers)
         while retries < max_retries:
+            # 熔断打开时直接返回，不占用连接
+            if not breaker.allow():
+                break
             try:
-                async with httpx.AsyncClient(
-                    headers=headers, auth=auth, proxy=proxy
-                ) as client:
-                    method = "POST" if post_data else "GET"
+                method = "POST" if post_data else "GET"
+                # 只对GET做条件请求，POST（如GraphQL查询）每次都要执行
+                conditional = validators.headers(key) if method == "GET" else {}
+                async with HttpClientPool.limit(url):
                     response = await client.request(
                         method,
                         url,
                         json=post_data,
                         params=query_params,
+                        headers=conditional,
                         timeout=timeout,
                     )
-
+                fetch_stats.response(source, response)
+
+                if response.status_code < 500 and response.status_code != 429:
+                    breaker.record_success()  # 上游可达，4xx是请求本身的问题
+                if response.status_code == 304:
+                    value = validators.value(key)
+                    if value is not None:
+                        return value
+                    # 没有可复用的结果（例如已被淘汰），去掉条件头重新请求
+                    validators.store(key, response, None)
+                    retries += 1
+                    continue
                 response.raise_for_status()  # Raise an error for bad status codes
-                return response.json()
+                value = response.json()
+                if method == "GET":
+                    validators.store(key, response, value)
+                return value
+            except httpx.HTTPStatusError as e:
+                logger.error(f"{url} {e}")
+                if response.status_code < 500 and response.status_code != 429:
+                    break  # 4xx重试也不会成功
+                breaker.record_failure()
+                retries += 1
             except Exception as e:
                 print(query_params)
+                breaker.record_failure()
                 retries += 1
                 logger.error(f"{url} {e}. Retrying ({retries}/{max_retries})...")
+            if retries < max_retries:
+                await asyncio.sleep(Backoff.delay(retries - 1))
 
         return {}
 
@@ -97,7 +177,9 @@ class DataFetcher:
     #     {"url": url, "post_data": {"query": stat_new_user()}},
     # ]
     @staticmethod
-    async def fetch_urls(urls_with_data, timeout=10, max_retries=2, headers=None):
+    async def fetch_urls(
+        urls_with_data, timeout=10, max_retries=2, headers=None, source=None
+    ):
         try:
             tasks = [
                 DataFetcher.async_fetch_data(
@@ -107,6 +189,7 @@ class DataFetcher:
                     query_params=url_data.get("query_params"),
                     timeout=timeout,
                     max_retries=max_retries,
+                    source=source,
                 )
                 for url_data in urls_with_data
             ]
@@ -116,6 +199,177 @@ class DataFetcher:
         return [None] * len(urls_with_data)
 
 
+class StreamingSource(abc.ABC):
+    """
+    推送数据源基类（WebSocket / SSE）：后台维持一条长连接，断开后按 Backoff 退避重连；
+    每条消息到达就增量解析，只保留最新值，再按 max_fps 限速交给 on_value，
+    行情连续推送时按键最多每秒重绘 max_fps 次。子类实现 _messages
+    """
+
+    max_fps = 2.0
+    _sources = weakref.WeakSet()
+
+    def __init__(
+        self, url, on_value, parse=json.loads, max_fps=None, headers=None, on_disconnect=None
+    ):
+        self.url = url
+        self.on_value = on_value  # value -> None 或协程
+        self.on_disconnect = on_disconnect  # 已建立的连接断开后调用，可以先切换到轮询
+        self.parse = parse  # 原始消息 -> 值，返回None表示忽略这条消息
+        self.max_fps = max_fps or self.max_fps
+        self.headers = headers or {}
+        self.latest = None
+        self.connected = False
+        self.received = 0
+        self.delivered = 0
+        self.reconnects = 0
+        self.errors = 0
+        self._dirty = False
+        self._last_delivery = 0.0
+        self._task = None
+        self._deliver_task = None
+        StreamingSource._sources.add(self)
+
+    @classmethod
+    def all_stats(cls):
+        return [source.stats() for source in cls._sources]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        for task in (self._task, self._deliver_task):
+            if task and not task.done():
+                task.cancel()
+        self._task = None
+        self._deliver_task = None
+        self.connected = False
+
+    @abc.abstractmethod
+    def _messages(self):
+        """
+        建立连接并逐条产出原始消息的 async generator，连接建立后设置 connected；
+        正常结束表示服务端关闭了连接，抛出异常表示出错，两种情况都会退避后重连
+        """
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                async for message in self._messages():
+                    attempt = 0
+                    value = self.parse(message)
+                    if value is not None:
+                        self._publish(value)
+                logger.info(f"{self.url} stream closed by server")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"{self.url} stream error: {e}")
+            if self.connected and self.on_disconnect:
+                try:
+                    self.on_disconnect()
+                except Exception as e:
+                    logger.error(f"{self.url} on_disconnect failed: {e}")
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(Backoff.delay(attempt))
+            attempt += 1
+
+    def _publish(self, value):
+        self.latest = value
+        self.received += 1
+        self._dirty = True
+        if self._deliver_task is None or self._deliver_task.done():
+            self._deliver_task = asyncio.get_running_loop().create_task(self._deliver())
+
+    async def _deliver(self):
+        # 等待期间到达的消息只更新latest，合并成一次重绘
+        while self._dirty:
+            wait = self._last_delivery + 1 / self.max_fps - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._dirty = False
+            self._last_delivery = time.monotonic()
+            self.delivered += 1
+            try:
+                result = self.on_value(self.latest)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"{self.url} on_value failed: {e}")
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "received": self.received,
+            "delivered": self.delivered,
+            "coalesced": self.received - self.delivered,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+        }
+
+
+class WebSocketSource(StreamingSource):
+    """
+    WebSocket推送源，连接建立后依次发送 subscribe 中的订阅消息
+    """
+
+    def __init__(self, url, on_value, subscribe=(), proxy=None, **kwargs):
+        super().__init__(url, on_value, **kwargs)
+        self.subscribe = list(subscribe)
+        self.proxy = proxy
+
+    async def _messages(self):
+        from websockets.asyncio.client import connect
+
+        # 没有配置代理时保持 websockets 的默认行为
+        options = {"proxy": self.proxy} if self.proxy else {}
+        async with connect(
+            self.url, additional_headers=self.headers, ping_interval=20, **options
+        ) as ws:
+            self.connected = True
+            for message in self.subscribe:
+                if not isinstance(message, str):
+                    message = json.dumps(message)
+                await ws.send(message)
+            async for message in ws:
+                yield message
+
+
+class SSESource(StreamingSource):
+    """
+    Server-Sent Events推送源，复用连接池的httpx客户端，按行增量解析，一个事件产出一次data
+    """
+
+    def __init__(self, url, on_value, proxy=None, auth=None, **kwargs):
+        super().__init__(url, on_value, **kwargs)
+        self.proxy = proxy
+        self.auth = auth
+
+    async def _messages(self):
+        client = HttpClientPool.get_client(proxy=self.proxy, auth=self.auth)
+        headers = {"Accept": "text/event-stream", **self.headers}
+        # 推送流没有读超时，断线由服务端关闭或网络错误触发重连
+        timeout = httpx.Timeout(10, read=None)
+        async with client.stream(
+            "GET", self.url, headers=headers, timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            self.connected = True
+            data = []
+            async for line in response.aiter_lines():
+                if not line:
+                    if data:
+                        yield "\n".join(data)
+                        data = []
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip(" "))
+
+
 class StreamDeckPlugin(BaseModel):
     name: Optional[str] = None
     title: Optional[str] = None
@@ -129,10 +383,16 @@ class StreamDeckPlugin(BaseModel):
 
     data: dict = Field(default_factory=dict)
     stop: bool = False
+    render_async: bool = False  # 在渲染线程池中绘制按键图片，不阻塞事件循环
+    config_digest: str = ""  # 插件配置的摘要，配置变化后持久化的帧不再使用
 
     def base_data_url(self):
         return StreamDeck.base_data_url()
 
+    # 上游熔断中，插件可以直接显示状态而不走网络
+    def upstream_down(self, url):
+        return CircuitBreaker.for_url(url).is_open
+
     async def async_fetch_data(
         self,
         url,
@@ -143,7 +403,9 @@ class StreamDeckPlugin(BaseModel):
         max_retries=2,
         proxy=None,
         auth=None,
+        ttl=None,
     ):
+        # 默认按插件的刷新间隔缓存，轮询时正好过期重新拉取
         return await DataFetcher.async_fetch_data(
             url,
             headers=headers,
@@ -153,29 +415,84 @@ class StreamDeckPlugin(BaseModel):
             max_retries=max_retries,
             proxy=proxy,
             auth=auth,
+            ttl=self.interval if ttl is None else ttl,
+            source=self.__class__.__name__,
         )
 
     async def fetch_urls(self, urls_with_data, headers=None, timeout=10, max_retries=2):
         return await DataFetcher.fetch_urls(
-            urls_with_data, headers=headers, timeout=timeout, max_retries=max_retries
+            urls_with_data,
+            headers=headers,
+            timeout=timeout,
+            max_retries=max_retries,
+            source=self.__class__.__name__,
         )
 
+    # 调用本进程内注册的命令/查询，替代访问自己的 HTTP 接口
+    async def call(self, name, **kwargs):
+        return await bus.call(name, **kwargs)
+
     def info(self, msg, *args, **kwargs):
         logger.info(msg, *args, **kwargs)
 
     def error(self, msg, *args, **kwargs):
         logger.error(msg, *args, **kwargs)
 
+    def render_args(self):
+        return (
+            self.title,
+            self.image,
+            self.margins,
+            self.background,
+            self.highlight_color,
+            self.text_vertical_alignment,
+        )
+
     def update_screen(self, deck):
         if not self.stop:
-            deck.update_screen(
-                self.title,
-                self.image,
-                self.margins,
-                self.background,
-                self.highlight_color,
-                self.text_vertical_alignment,
-            )
+            args = self.render_args()
+            if self.render_async:
+                task = asyncio.get_running_loop().create_task(deck.render_async(*args))
+                _render_tasks.add(task)
+                task.add_done_callback(_render_tasks.discard)
+            else:
+                deck.update_screen(*args)
+
+    # 拿到数据之前的占位绘制（Loading、图标）：按键上还是缓存恢复的帧时跳过，避免把它覆盖掉
+    def show_placeholder(self, deck):
+        if not deck.restored:
+            self.update_screen(deck)
+
+    # 在统一的调度器里定时执行 func(deck)，页面不可见时暂停或降频
+    def schedule(self, deck, func, interval=None, align=False):
+        first = True
+
+        # 出现后的第一次刷新可以先用缓存的旧值，后台刷新完成后再执行一次；之后的定时刷新要求新数据
+        async def job():
+            nonlocal first
+            if not first:
+                return await func(deck)
+            first = False
+            pending = []
+            stale_ok.set(True)
+            revalidations.set(pending)
+            await func(deck)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                stale_ok.set(False)
+                await func(deck)
+
+        poll_scheduler.register(
+            self,
+            f"{self.__class__.__name__}[{deck.key}] {self.name}",
+            job,
+            interval or self.interval,
+            align=align,
+        )
+
+    # 只刷新数据和标题、不绘制，用于相邻页面的后台预热
+    async def prefetch(self) -> None:
+        pass
 
     # event when the plugin start display on key
     async def on_will_appear(self, deck) -> None:
@@ -185,6 +502,11 @@ class StreamDeckPlugin(BaseModel):
     # event when the plugin stop display on key
     async def on_will_disappear(self, deck) -> None:
         self.stop = True  # Signal the event to stop the loop
+        poll_scheduler.set_visible(self, False)
+        deck.stop_marquee()
+
+    # 重新加载配置后插件被删除时调用，用于释放连接等共享资源
+    async def on_unload(self) -> None:
         pass
 
     async def on_key_double_click(self, deck) -> None:
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+
+class Frame(NamedTuple):
+    """
+    一次渲染的结果：缩放并绘制文字后的按键图片，设备原生格式的字节及其摘要，
+    以及同时生成的按下状态（内缩）的原生字节，按键时只需要一次USB写入
+    """
+
+    image: Any
+    native: Any
+    digest: bytes
+    pressed: Any
+    pressed_digest: bytes
+
+    @property
+    def nbytes(self):
+        return (
+            len(self.native)
+            + len(self.pressed)
+            + self.image.width * self.image.height * len(self.image.getbands())
+        )
+
+
+class LRUCache:
+    """
+    按内存预算淘汰的LRU缓存，记录命中/未命中次数；渲染线程池和事件循环会同时访问，需要加锁
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= self.sizeof(old)
+            self._items[key] = value
+            self.bytes += size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._items:
+            _, value = self._items.popitem(last=False)
+            self.bytes -= self.sizeof(value)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+frame_cache = LRUCache(sizeof=lambda frame: frame.nbytes)
+
+
+def key_geometry(deck):
+    # 按键尺寸、旋转、翻转都会影响最终的原生字节
+    if hasattr(deck, "key_image_format"):
+        return repr(deck.key_image_format())
+    if hasattr(deck, "key_image_size"):
+        return repr(deck.key_image_size())
+    return deck.__class__.__name__
+
+
+def mark_transient(image):
+    """
+    标记每次都重新生成、不会再出现的PIL图片（例如每秒一帧的时钟），渲染时不进帧缓存，
+    也不用按像素计算hash，避免挤掉其它按键的帧
+    """
+    image.info["transient"] = True
+    return image
+
+
+def is_transient(image):
+    return hasattr(image, "info") and image.info.get("transient", False)
+
+
+def image_token(image):
+    # SVG字符串直接参与hash，图片文件用路径+修改时间+大小，避免每次读文件，PIL图片按像素hash
+    if hasattr(image, "tobytes"):
+        h = hashlib.blake2b(image.tobytes(), digest_size=16)
+        return (image.mode, image.size, h.hexdigest())
+    if isinstance(image, str) and not image.strip().startswith("<"):
+        try:
+            st = os.stat(image)
+            return f"{image}:{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return image
+    return image
+
+
+def frame_key(deck, title, image, *style):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(deck.__module__.encode())
+    h.update(key_geometry(deck).encode())
+    for part in (title, image_token(image), *style):
+        h.update(b"\0")
+        h.update(repr(part).encode())
+    return h.digest()
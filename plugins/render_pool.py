@@ -0,0 +1,88 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RenderPool:
+    """
+    把按键图片渲染（cairosvg、PIL缩放、文字、编码）放到有界线程池里执行，不阻塞事件循环。
+    每个按键最多一个在渲染、一个在排队，新提交的帧会取代排队中的旧帧
+    """
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self.rendered = 0
+        self.dropped = 0
+        self._executor = None
+        self._pending = {}  # slot -> (func, args, waiter)
+        self._running = set()
+
+    def configure(self, max_workers):
+        if max_workers != self.max_workers:
+            self.shutdown()
+            self.max_workers = max_workers
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="render"
+            )
+        return self._executor
+
+    async def submit(self, slot, func, *args):
+        """
+        提交渲染任务并等待结果；如果在开始渲染前被同一slot的新帧取代，返回None
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        superseded = self._pending.pop(slot, None)
+        if superseded:
+            self._resolve(superseded[2], None)
+            self.dropped += 1
+        self._pending[slot] = (func, args, waiter)
+        if slot not in self._running:
+            self._start(loop, slot)
+        return await waiter
+
+    def _start(self, loop, slot):
+        func, args, waiter = self._pending.pop(slot)
+        self._running.add(slot)
+        future = loop.run_in_executor(self._get_executor(), func, *args)
+        future.add_done_callback(lambda f: self._done(loop, slot, f, waiter))
+
+    def _done(self, loop, slot, future, waiter):
+        self._running.discard(slot)
+        if slot in self._pending:
+            # 渲染期间又来了新帧，这一帧已经过时，不再写到设备
+            self._resolve(waiter, None)
+            self.dropped += 1
+            self._start(loop, slot)
+        elif future.cancelled():
+            waiter.cancel()
+        elif future.exception():
+            if not waiter.done():
+                waiter.set_exception(future.exception())
+        else:
+            self._resolve(waiter, future.result())
+            self.rendered += 1
+
+    @staticmethod
+    def _resolve(waiter, result):
+        if not waiter.done():
+            waiter.set_result(result)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "rendered": self.rendered,
+            "dropped": self.dropped,
+            "pending": len(self._pending),
+            "running": len(self._running),
+        }
+
+
+render_pool = RenderPool()
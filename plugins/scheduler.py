@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger("asyncio")
+
+
+class Job:
+    __slots__ = (
+        "name",
+        "func",
+        "interval",
+        "align",
+        "visible",
+        "generation",
+        "running",
+        "last_run",
+        "last_duration",
+        "lateness",
+        "max_lateness",
+        "runs",
+        "failures",
+        "timeouts",
+        "skipped",
+    )
+
+    def __init__(self, name, func, interval, align):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.align = align
+        self.visible = True
+        self.generation = 0
+        self.running = False
+        self.last_run = 0
+        self.last_duration = 0
+        self.lateness = 0
+        self.max_lateness = 0
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "align": self.align,
+            "visible": self.visible,
+            "running": self.running,
+            "last_run": self.last_run,
+            "last_duration": round(self.last_duration, 4),
+            "lateness": round(self.lateness, 4),
+            "max_lateness": round(self.max_lateness, 4),
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+        }
+
+
+class PollScheduler:
+    """
+    所有插件的定时刷新由一个调度任务统一驱动（最小堆），替代每个插件自己的 while + sleep：
+    - 按上一次计划时间推算下一次，不随执行耗时漂移；可以对齐到墙上时间的整数倍（如时钟对齐到整秒）
+    - 非对齐任务加随机抖动，避免同时触发
+    - 不可见页面上的任务暂停（hidden_rate=0）或按 hidden_rate 倍间隔降频
+    - 同时执行的刷新数不超过 max_concurrent；单次刷新超过 job_timeout 秒取消并计为失败，
+      卡住的任务不会一直占着名额
+    """
+
+    max_concurrent = 4
+    job_timeout = 30  # seconds
+    hidden_rate = 0
+    jitter = 0.1  # 间隔的比例
+
+    @classmethod
+    def initialize(cls, config):
+        cls.max_concurrent = config.get("max_concurrent", cls.max_concurrent)
+        cls.hidden_rate = config.get("hidden_rate", cls.hidden_rate)
+        cls.jitter = config.get("jitter", cls.jitter)
+        cls.job_timeout = config.get("job_timeout", cls.job_timeout)
+
+    def __init__(self):
+        self._jobs = {}  # id(owner) -> Job
+        self._heap = []  # (due, seq, generation, job)
+        self._seq = itertools.count()
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._limit = None
+
+    def register(self, owner, name, func, interval, align=False, run_now=True):
+        """
+        func: 无参数的协程函数；同一个owner重复注册会替换原来的任务
+        """
+        job = self._jobs.get(id(owner))
+        if job is None:
+            job = self._jobs[id(owner)] = Job(name, func, interval, align)
+        else:
+            job.name, job.func, job.interval, job.align = name, func, interval, align
+        job.visible = True
+        now = time.time()
+        self._push(job, now if run_now else self._next_time(job, now, now))
+        return job
+
+    def unregister(self, owner):
+        job = self._jobs.pop(id(owner), None)
+        if job:
+            job.generation += 1
+
+    def set_visible(self, owner, visible):
+        job = self._jobs.get(id(owner))
+        if job is None or job.visible == visible:
+            return
+        job.visible = visible
+        now = time.time()
+        if visible:
+            self._push(job, now)
+        elif self.hidden_rate > 0:
+            self._push(job, self._next_time(job, now, now))
+        else:
+            job.generation += 1  # 暂停：让堆里的条目失效
+
+    def _period(self, job):
+        return job.interval if job.visible else job.interval * self.hidden_rate
+
+    def _next_time(self, job, due, now):
+        period = self._period(job)
+        if job.align:
+            return (math.floor(now / period) + 1) * period
+        next_run = due + period
+        if next_run <= now:
+            next_run = now + period  # 落后太多，不补跑
+        return next_run + random.uniform(0, period * self.jitter)
+
+    def _push(self, job, due):
+        job.generation += 1
+        heapq.heappush(self._heap, (due, next(self._seq), job.generation, job))
+        if self._task is None or self._task.done():
+            # 使用干净的上下文，不继承注册方（例如按键回调）的contextvars
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context()
+            )
+        self._wakeup.set()
+
+    async def _run(self):
+        self._limit = asyncio.Semaphore(self.max_concurrent)
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, generation, job = heapq.heappop(self._heap)
+                if generation != job.generation:
+                    continue
+                if job.running:
+                    job.skipped += 1
+                else:
+                    job.running = True
+                    loop.create_task(self._execute(job, due))
+                next_run = self._next_time(job, due, now)
+                heapq.heappush(self._heap, (next_run, next(self._seq), job.generation, job))
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job, due):
+        try:
+            async with self._limit:
+                start = time.time()
+                job.lateness = max(start - due, 0)
+                job.max_lateness = max(job.max_lateness, job.lateness)
+                job.last_run = start
+                await asyncio.wait_for(job.func(), self.job_timeout)
+                job.last_duration = time.time() - start
+                job.runs += 1
+        except asyncio.TimeoutError:
+            job.failures += 1
+            job.timeouts += 1
+            logger.error(f"{job.name} timed out after {self.job_timeout}s")
+        except Exception as e:
+            job.failures += 1
+            logger.exception(e)
+        finally:
+            job.running = False
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "job_timeout": self.job_timeout,
+            "hidden_rate": self.hidden_rate,
+            "jobs": [job.stats() for job in self._jobs.values()],
+        }
+
+
+poll_scheduler = PollScheduler()
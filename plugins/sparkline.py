@@ -0,0 +1,51 @@
+import numpy as np
+from PIL import Image
+
+# 心跳状态 -> 柱子颜色：DOWN / UP / PENDING / MAINTENANCE
+STATUS_COLORS = np.array(
+    [
+        [220, 40, 40, 255],
+        [40, 200, 80, 255],
+        [230, 200, 40, 255],
+        [60, 120, 230, 255],
+    ],
+    dtype=np.uint8,
+)
+
+
+def history_arrays(history):
+    """
+    按时间顺序返回 (ping, status) 两个numpy数组，直接引用 array 的内存再做一次滚动
+    """
+    ping = np.frombuffer(history.ping, dtype=np.float32)
+    status = np.frombuffer(history.status, dtype=np.int8)
+    order = (np.arange(history.count) + history.head - history.count) % history.size
+    return ping[order], status[order]
+
+
+def render_sparkline(history, size=72, band=(0.3, 0.75)):
+    """
+    把历史画成按键大小的透明RGBA柱状条，按键背景色可以透出来：柱高按窗口内最大ping归一化，
+    颜色表示状态，DOWN画满格；整张图用numpy一次算出，不逐像素绘制。上下留出空白给标题和名称
+    """
+    image = np.zeros((size, size, 4), dtype=np.uint8)
+    ping, status = history_arrays(history)
+    if not len(ping):
+        return Image.fromarray(image)
+
+    top, bottom = int(size * band[0]), int(size * band[1])
+    height = bottom - top
+    peak = ping.max()
+    bars = np.where(status == 0, 1.0, ping / peak if peak > 0 else 0.0)
+    bars = np.maximum(np.rint(bars * height), 1).astype(np.int32)
+
+    # 每个采样占 size / History.size 列，最新的在最右边
+    columns = np.arange(size) * history.size // size - (history.size - len(ping))
+    valid = columns >= 0
+    columns = np.clip(columns, 0, len(ping) - 1)
+
+    rows = np.arange(height)[:, None]
+    mask = (rows >= height - bars[columns][None, :]) & valid[None, :]
+    colors = STATUS_COLORS[np.clip(status[columns], 0, len(STATUS_COLORS) - 1)]
+    image[top:bottom] = np.where(mask[..., None], colors[None, :, :], image[top:bottom])
+    return Image.fromarray(image)
@@ -1,52 +1,70 @@
-import time
+import threading
 from io import BytesIO
 from typing import Any, ClassVar
 
-import cairosvg
-from dingtalkchatbot.chatbot import DingtalkChatbot
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageFont
 from pydantic import BaseModel
 from pydantic.fields import Field
 
+from plugins.compositor import Compositor, compositor_for
+from plugins.encoder import NativeEncoder, pil_helper
+from plugins.executor import blocking_executor
+from plugins.key_writer import digest_of
+from plugins.marquee import Marquee, marquee_scheduler
+from plugins.render_cache import Frame, frame_cache, frame_key, is_transient
+from plugins.render_pool import render_pool
+from plugins.text_cache import draw_line, text_cache
+
 
 class DingTalk:
     @classmethod
     def initialize(cls, config):
         token = config.get("token", "")
-        url = f"https://oapi.dingtalk.com/robot/send?access_token=" + token
-        cls.dingtalk = DingtalkChatbot(url)
+        cls.url = f"https://oapi.dingtalk.com/robot/send?access_token=" + token
+        cls.dingtalk = None
 
     @staticmethod
-    def send_markdown(title, text):
-        DingTalk.dingtalk.send_markdown(title=title, text=text, is_at_all=True)
+    async def send_markdown(title, text):
+        if DingTalk.dingtalk is None:
+            # 只有真正发送消息时才导入钉钉SDK
+            from dingtalkchatbot.chatbot import DingtalkChatbot
+
+            DingTalk.dingtalk = DingtalkChatbot(DingTalk.url)
+        return await blocking_executor.run(
+            "dingtalk.send_markdown",
+            DingTalk.dingtalk.send_markdown,
+            title=title,
+            text=text,
+            is_at_all=True,
+        )
 
 
 class TextSetting:
     _initialized = False
-    tiny_font = None
-    small_font = None
-    medium_font = None
-    bold_font = None
+    font_path = "./Assets/Arial-Unicode-Bold.ttf"
+    font_sizes = {}  # tiny_font / small_font / medium_font / bold_font -> 字号
     max_lines = 0
+    # FreeType的字体对象不能被多个线程同时使用，事件循环和每个渲染线程各自加载一份
+    _local = threading.local()
 
     @classmethod
     def initialize_fonts(cls, config):
         if not cls._initialized:
-            cls.tiny_font = ImageFont.truetype(
-                "./Assets/Arial-Unicode-Bold.ttf", config["fonts"]["tiny_font"]
-            )
-            cls.small_font = ImageFont.truetype(
-                "./Assets/Arial-Unicode-Bold.ttf", config["fonts"]["small_font"]
-            )
-            cls.medium_font = ImageFont.truetype(
-                "./Assets/Arial-Unicode-Bold.ttf", config["fonts"]["medium_font"]
-            )
-            cls.bold_font = ImageFont.truetype(
-                "./Assets/Arial-Unicode-Bold.ttf", config["fonts"]["bold_font"]
-            )
+            cls.font_sizes = {
+                name: config["fonts"][name]
+                for name in ("tiny_font", "small_font", "medium_font", "bold_font")
+            }
             cls.max_lines = config.get("max_lines", 4)
             cls._initialized = True
 
+    @classmethod
+    def font(cls, name):
+        fonts = cls._local.__dict__.setdefault("fonts", {})
+        font = fonts.get(name)
+        if font is None:
+            font = fonts[name] = ImageFont.truetype(cls.font_path, cls.font_sizes[name])
+        return font
+
 
 class StreamDeck(BaseModel):
     bright_level: ClassVar[int] = 60
@@ -55,6 +73,8 @@ class StreamDeck(BaseModel):
     deck: Any = Field(default=None)
     key: int
     key_image: Any = Field(default=None)
+    frame: Any = Field(default=None)
+    restored: bool = False  # 当前显示的是缓存/warm store恢复的帧，插件还没有用新数据重绘过
     data_port: int = 8000
 
     config: dict = Field(default={})
@@ -69,6 +89,20 @@ class StreamDeck(BaseModel):
         StreamDeck.data_port = config.get("server_port", 8000)
         DingTalk.initialize(config["dingtalk"])
         TextSetting.initialize_fonts(config["text_setting"])
+        Compositor.initialize(config.get("compositor", {}))
+        NativeEncoder.initialize(config)
+        frame_cache.configure(
+            config.get("frame_cache", {}).get("max_bytes", frame_cache.max_bytes)
+        )
+        render_pool.configure(
+            config.get("render_pool", {}).get("max_workers", render_pool.max_workers)
+        )
+        text_cache.configure(
+            config.get("text_cache", {}).get("max_bytes", text_cache.max_bytes)
+        )
+        marquee_scheduler.configure(
+            config.get("marquee", {}).get("fps", marquee_scheduler.fps)
+        )
 
     @staticmethod
     def set_bright_level(level=0):
@@ -87,58 +121,160 @@ class StreamDeck(BaseModel):
         highlight_color="yellow",
         text_vertical_alignment="center",
     ):
-        if not image:
-            image = '<svg width="400" height="400"></svg>'
-
         try:
-            if _is_svg(image):
-                png_data = cairosvg.svg2png(bytestring=image)
-                icon = Image.open(BytesIO(png_data))
-            else:
-                icon = Image.open(image)
+            frame = self.render_frame(
+                title,
+                image,
+                margins,
+                background,
+                highlight_color,
+                text_vertical_alignment,
+            )
+            compositor_for(self.deck).submit(self.key, frame.native, frame.digest)
+            self.key_image = frame.image
+            self.frame = frame
+            self.restored = False
+        except Exception as e:
+            print(e)
 
-            if self.deck.__module__.startswith("StreamDock"):
-                from StreamDock.ImageHelpers import PILHelper
-            else:
-                from StreamDeck.ImageHelpers import PILHelper
+    def key_image_size(self):
+        if hasattr(self.deck, "key_image_format"):
+            return self.deck.key_image_format()["size"]
+        return self.deck.key_image_size()
 
-            scaled_image = PILHelper.create_scaled_key_image(
-                self.deck, icon, margins=margins, background=background
-            )
-            _draw_text(scaled_image, title, highlight_color, text_vertical_alignment)
-            self.deck.set_key_image(
-                self.key, PILHelper.to_native_key_format(self.deck, scaled_image)
+    async def render_async(
+        self,
+        title,
+        image,
+        margins=[0, 0, 0, 0],
+        background="black",
+        highlight_color="yellow",
+        text_vertical_alignment="center",
+    ):
+        try:
+            frame = await render_pool.submit(
+                (id(self.deck), self.key),
+                self.render_frame,
+                title,
+                image,
+                margins,
+                background,
+                highlight_color,
+                text_vertical_alignment,
             )
-            self.key_image = scaled_image
+            # None表示这一帧已被同一按键更新的帧取代
+            if frame is not None:
+                compositor_for(self.deck).submit(self.key, frame.native, frame.digest)
+                self.key_image = frame.image
+                self.frame = frame
+                self.restored = False
+            return frame
         except Exception as e:
             print(e)
 
+    def render_frame(
+        self,
+        title,
+        image,
+        margins=[0, 0, 0, 0],
+        background="black",
+        highlight_color="yellow",
+        text_vertical_alignment="center",
+    ):
+        if not image:
+            image = '<svg width="400" height="400"></svg>'
+
+        if is_transient(image):
+            return _render_frame(
+                self.deck,
+                title,
+                image,
+                margins,
+                background,
+                highlight_color,
+                text_vertical_alignment,
+            )
+
+        key = frame_key(
+            self.deck,
+            title,
+            image,
+            margins,
+            background,
+            highlight_color,
+            text_vertical_alignment,
+        )
+        frame = frame_cache.get(key)
+        if frame is None:
+            frame = _render_frame(
+                self.deck,
+                title,
+                image,
+                margins,
+                background,
+                highlight_color,
+                text_vertical_alignment,
+            )
+            frame_cache.put(key, frame)
+        return frame
+
+    def write_image(self, image):
+        native = NativeEncoder.encode(self.deck, image)
+        compositor_for(self.deck).submit(self.key, native)
+        self.key_image = image
+        self.frame = None
+
     def create_marquee_text(
         self,
         title,
         background="black",
+        fps=None,
     ):
-        # 计算每行文字宽度
         try:
-            line_widths = []
-            font = TextSetting.medium_font
-            for line in title:
-                bbox = font.getbbox(line)  # 返回 (x0, y0, x1, y1)
-                w = bbox[2] - bbox[0]  # 文字宽度
-                line_widths.append(w)
-
-            _create_marquee_text(
-                self.deck, self.key, title, line_widths, offsets=[0] * len(title)
+            marquee = Marquee(
+                title, self.key_image_size(), TextSetting.font("medium_font"), background
             )
+            marquee_scheduler.start(self, marquee, fps)
         except Exception as e:
             import traceback
 
             print("Error in create_marquee_text:")
             print(traceback.format_exc())
 
+    def stop_marquee(self):
+        marquee_scheduler.stop(self)
+
+
+PRESSED_MARGINS = [10, 10, 10, 10]
+
+
+def _render_frame(
+    deck, title, image, margins, background, highlight_color, text_vertical_alignment
+):
+    if isinstance(image, Image.Image):
+        icon = image
+    elif _is_svg(image):
+        import cairosvg  # 只有SVG图标才需要，启动时不加载
+
+        png_data = cairosvg.svg2png(bytestring=image)
+        icon = Image.open(BytesIO(png_data))
+    else:
+        icon = Image.open(image)
+
+    PILHelper = pil_helper(deck)
+    scaled_image = PILHelper.create_scaled_key_image(
+        deck, icon, margins=margins, background=background
+    )
+    _draw_text(scaled_image, title, highlight_color, text_vertical_alignment)
+    native = NativeEncoder.encode(deck, scaled_image)
+    pressed_image = PILHelper.create_scaled_key_image(
+        deck, scaled_image, margins=PRESSED_MARGINS
+    )
+    pressed = NativeEncoder.encode(deck, pressed_image)
+    return Frame(scaled_image, native, digest_of(native), pressed, digest_of(pressed))
+
 
 def _draw_text(image, label_text, highlight_color, text_vertical_alignment="center"):
-    draw = ImageDraw.Draw(image)
     y = 0
     if label_text:
         lines = label_text.split("\n")
@@ -158,26 +294,26 @@ def _draw_text(image, label_text, highlight_color, text_vertical_alignment="cent
             x = (image.width) // 2
             color = "white"
             if index == 0:
-                f = TextSetting.bold_font
+                f = TextSetting.font("bold_font")
                 y += f.size
             elif index == 1:
-                f = TextSetting.medium_font
+                f = TextSetting.font("medium_font")
                 y += f.size
             elif index == 2:
-                f = TextSetting.small_font
+                f = TextSetting.font("small_font")
                 y += f.size
             elif index == 3:
-                f = TextSetting.tiny_font
+                f = TextSetting.font("tiny_font")
                 color = highlight_color
                 y += f.size
             elif index == 4:
                 color = highlight_color
                 y += f.size
             else:
-                f = TextSetting.small_font
+                f = TextSetting.font("small_font")
                 color = highlight_color
                 y += f.size
-            draw.text((x, y), text=line, font=f, anchor="ms", fill=color)
+            draw_line(image, (x, y), line, f, color)
 
 
 def _is_svg(svg_string):
@@ -185,42 +321,3 @@ def _is_svg(svg_string):
         svg_string = svg_string.strip()
         return svg_string.startswith("<") and svg_string.endswith("</svg>")
     return False
-
-
-TEXT_COLOR = (255, 255, 255)
-BG_COLOR = (0, 0, 0)
-SCROLL_SPEED = 0.05  # 秒/帧
-FONT_SIZE = 20
-
-
-def _create_marquee_text(deck, key_index, lines, line_widths, offsets):
-    # 初始化每行偏移
-    from StreamDock.ImageHelpers import PILHelper
-
-    offsets = [0] * len(lines)
-    while True:
-        img = _create_marquee_image(deck, lines, line_widths, offsets)
-        deck.set_key_image(key_index, PILHelper.to_native_key_format(deck, img))
-        # 每行文字更新偏移量
-        for i in range(len(lines)):
-            offsets[i] += 2  # 每帧移动像素
-            if offsets[i] >= line_widths[i]:
-                offsets[i] = 0
-        time.sleep(SCROLL_SPEED)
-
-
-# 创建跑马灯图像
-def _create_marquee_image(deck, lines, line_widths, offsets):
-    # key_w, key_h = deck.key_image_size()
-    key_w, key_h = (100, 100)
-    font = TextSetting.medium_font
-    image = Image.new("RGB", (key_w, key_h), color=BG_COLOR)
-    draw = ImageDraw.Draw(image)
-    for i, line in enumerate(lines):
-        offset_x = offsets[i]
-        y = i * FONT_SIZE
-        # 绘制循环文字
-        draw.text((-offset_x, y), line, font=font, fill=TEXT_COLOR)
-        if line_widths[i] > key_w:
-            draw.text((line_widths[i] - offset_x, y), line, font=font, fill=TEXT_COLOR)
-    return image
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timezone
 
@@ -6,6 +5,8 @@ from .plugin import StreamDeckPlugin
 
 logger = logging.getLogger("asyncio")
 
+TAILSCALE_URL = "https://api.tailscale.com/api/v2/tailnet/-/devices"
+
 
 class TailscalePlugin(StreamDeckPlugin):
     key_up_count: int = 0
@@ -18,11 +19,9 @@ class TailscalePlugin(StreamDeckPlugin):
         self.api_key = api_key
 
     async def fetch_data(self):
-        url = "https://api.tailscale.com/api/v2/tailnet/-/devices"
-        return await self.async_fetch_data(url, auth=(self.api_key, ""))
+        return await self.async_fetch_data(TAILSCALE_URL, auth=(self.api_key, ""))
 
-    async def update_deck(self, deck):
-        self.update_screen(deck)
+    async def prefetch(self):
         data = await self.fetch_data()
         if data:
             # print(data)
@@ -64,20 +63,23 @@ class TailscalePlugin(StreamDeckPlugin):
             else:
                 self.image = self.bg_image
                 self.title = f"\n\n{total}"
+        elif self.upstream_down(TAILSCALE_URL):
+            self.title = "\nUpstream\nDown"
+        return data
 
+    async def update_deck(self, deck):
+        self.show_placeholder(deck)
+        # 没有数据但熔断器打开时也要重绘，显示 Upstream Down
+        if await self.prefetch() or self.upstream_down(TAILSCALE_URL):
             self.update_screen(deck)
 
-    async def run(self, deck):
-        while not self.stop:
-            await self.update_deck(deck)
-            await asyncio.sleep(self.interval)
-
     async def on_will_appear(self, deck) -> None:
-        self.update_screen(deck)
-        await self.run(deck)
+        await super().on_will_appear(deck)
+        self.show_placeholder(deck)
+        self.schedule(deck, self.update_deck)
 
     async def on_will_disappear(self, deck) -> None:
-        pass
+        await super().on_will_disappear(deck)
 
     async def on_key_up(self, deck) -> None:
         self.key_up_count = self.key_up_count + 1
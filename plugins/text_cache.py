@@ -0,0 +1,40 @@
+from typing import Any, NamedTuple
+
+from PIL import Image, ImageDraw
+
+from plugins.render_cache import LRUCache
+
+
+class LineBitmap(NamedTuple):
+    offset: tuple  # 相对锚点(中线, 基线)的左上角偏移
+    mask: Any
+
+    @property
+    def nbytes(self):
+        return self.mask.width * self.mask.height
+
+
+text_cache = LRUCache(max_bytes=1024 * 1024, sizeof=lambda bitmap: bitmap.nbytes)
+
+
+def line_bitmap(text, font):
+    key = (text, font.path, font.size)
+    bitmap = text_cache.get(key)
+    if bitmap is None:
+        left, top, right, bottom = font.getbbox(text, anchor="ms")
+        mask = Image.new("L", (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, anchor="ms", fill=255)
+        bitmap = LineBitmap((left, top), mask)
+        text_cache.put(key, bitmap)
+    return bitmap
+
+
+def draw_line(image, xy, text, font, color):
+    """
+    等价于 draw.text(xy, text, font=font, anchor="ms", fill=color)，
+    但字形只栅格化一次：缓存的是灰度遮罩，颜色在合成时填充，同一行文字的不同颜色共用一份
+    """
+    if not text:
+        return
+    bitmap = line_bitmap(text, font)
+    image.paste(color, (xy[0] + bitmap.offset[0], xy[1] + bitmap.offset[1]), bitmap.mask)
@@ -1,19 +1,26 @@
 from .plugin import StreamDeckPlugin
 
 from uptime_kuma_api import UptimeKumaApi
-import pandas as pd
 from pydantic import Field
-from typing import ClassVar
+from typing import Any, ClassVar, List
 import asyncio
+import threading
 from datetime import datetime
 import traceback 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+
+from .bus import bus
+from .executor import blocking_executor
+from .monitor_store import MonitorStore
+from .sparkline import render_sparkline
 
 router = APIRouter(
     prefix="/uptime",
     tags=["plugin"]
 )
 
+FIRST_CALL_TIMEOUT = 5  # seconds，等待首次登录和拉取的最长时间
+
 @router.get("/ok")
 async def health_check():
     return "OK"
@@ -21,32 +28,96 @@ async def health_check():
 @router.get("/stop")
 async def stop(url: str, monitor_id: int, key_up_count: int):
     api = SingletonUptimeApi.get_instance_by_url(url)
-    api.logout()
+    await blocking_executor.run("uptime.logout", api._logout)
 
 @router.get("/get_data")
 async def get_data(url: str, monitor_id: int, key_up_count: int, interval: int):
+    tile = await bus.call(
+        "uptime.get_data",
+        url=url,
+        monitor_id=monitor_id,
+        key_up_count=key_up_count,
+        interval=interval,
+    )
+    return public_tile(tile)
+
+@router.get("/get_tiles")
+async def get_tiles(
+    url: str,
+    monitor_ids: List[int] = Query(),
+    key_up_counts: List[int] = Query(default=[]),
+    interval: int = 60,
+):
+    counts = key_up_counts + [0] * (len(monitor_ids) - len(key_up_counts))
+    result = await bus.call(
+        "uptime.get_tiles",
+        url=url,
+        requests=list(zip(monitor_ids, counts)),
+        interval=interval,
+    )
+    return {**result, "tiles": [public_tile(tile) for tile in result["tiles"]]}
+
+# 插件在进程内直接调用，HTTP接口只是对外的适配层
+@bus.register("uptime.get_data")
+async def get_tile_data(url: str, monitor_id: int, key_up_count: int, interval: int):
+    result = await get_tiles_data(url, [(monitor_id, key_up_count)], interval)
+    return {**result["tiles"][0], "version": result["version"]}
+
+@bus.register("uptime.get_tiles")
+async def get_tiles_data(url: str, requests: list, interval: int):
+    """
+    一次返回多个按键的状态，requests 是 [(monitor_id, key_up_count), ...]；
+    每个 (monitor_id, 视图) 在同一数据版本内只计算一次
+    """
     api = SingletonUptimeApi.get_instance_by_url(url)
     if not api.task:
         api.task = AsyncRequester(api._login, interval)
-    
-    await api.task._first_call_done_event.wait()
 
+    # 首次登录和拉取还没完成（或者连不上）时最多等 FIRST_CALL_TIMEOUT 秒，
+    # 之后按空的store返回 Loading 占位，不占住调度器的名额
+    try:
+        await asyncio.wait_for(
+            api.task._first_call_done_event.wait(), FIRST_CALL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        pass
+
+    version = api.store.version
+    return {
+        "version": version,
+        "tiles": [
+            api.tile(monitor_id, tile_view(monitor_id, key_up_count), version)
+            for monitor_id, key_up_count in requests
+        ],
+    }
+
+# 单个监控按键循环显示：可用率 / ping / 历史柱状条；汇总按键：数量 / 第一个异常
+MONITOR_VIEWS = 3
+SUMMARY_VIEWS = 2
+HISTORY_VIEW = 2
+
+def tile_view(monitor_id, key_up_count):
+    return key_up_count % (MONITOR_VIEWS if monitor_id > 0 else SUMMARY_VIEWS)
+
+def public_tile(tile):
+    # 历史柱状条是PIL图片，只给进程内的插件使用，HTTP接口不返回
+    return {k: v for k, v in tile.items() if k != "image"}
+
+def compute_tile(store, monitor_id: int, view: int):
     title = "\nLoading..."
     background = "black"
-    
+    image = None
+
     try:
-        monitors_df = api.monitors           
-        if monitors_df is not None and not monitors_df.empty:
+        if store:
             if monitor_id > 0:
-                df = monitors_df[monitors_df['id'] == monitor_id]
-                if not df.empty:
-                    node = df.iloc[0]
-                    # print(node)
+                node = store.get(monitor_id)
+                if node is not None:
                     uptime_in_24 = f"{node.uptime_in_24 * 100:.2f}%"
                     uptime_in_720 = f"{node.uptime_in_720 * 100:.2f}%"
                     down_count = node.down_count
-                    ping = f"{node.ping} ms"                      
-                    
+                    ping = f"{node.ping} ms"
+
                     if node.uptime_in_24 < 0.8:
                         background = "red"
                     elif int(node.uptime_in_24) == 1:
@@ -54,52 +125,120 @@ async def get_data(url: str, monitor_id: int, key_up_count: int, interval: int):
                     else:
                         background = "#999900"
 
-                    if key_up_count % 2 == 0:
+                    if view == 0:
                        title = f"{uptime_in_24}\n{uptime_in_720}\n{node.msg}"
+                    elif view == HISTORY_VIEW:
+                        title = ping
+                        background = "black"  # DOWN画成红色柱子，背景不能也是红色
+                        image = render_sparkline(store.history(monitor_id))
                     else:
-                        if pd.isna(node.parent):
-                            title = f"{convert_to_multiple_lines(node.msg)}"
-                        else:
-                            title = f"Ping:\n{ping}\nDown: {down_count}"
+                        title = f"Ping:\n{ping}\nDown: {down_count}"
                 else:
                     title = "\nLoading..."
             else:
-                ok_monitors = monitors_df[monitors_df['active'] & (monitors_df['status'] == 1)]                    
-                error_monitors = monitors_df[monitors_df['active'] & (monitors_df['status'] == 0) & (monitors_df['parent'].notna())]
-                succ_count = len(ok_monitors)
-                err_count = len(error_monitors)
+                # 正常/异常数量由store增量维护，不需要扫描全部监控
+                succ_count = store.ok_count
+                err_count = store.err_count
                 if err_count>0:
                     background = "red"
                 else:
                     background = "green"
-                if key_up_count % 2 == 0:
+                if view == 0:
                     title = f"Succ: {succ_count}\nErr: {err_count}"
                 else:
-                    if not error_monitors.empty:
-                        node = error_monitors.iloc[0]
+                    node = store.first_error()
+                    if node is not None:
                         msg = convert_to_multiple_lines(f"{node.id} {node.msg}")
                     else:
                         msg = "All\nClean"
                         background = "green"
-                    title = f"{msg}"            
+                    title = f"{msg}"
     except Exception as e:
         print(e)
         traceback.print_exc()
-    
+
     return {
         "title" : title,
-        "background" : background
+        "background" : background,
+        "image": image,
     }
 
 @router.get("/get_monitors")
 async def get_monitors(url):
     api = SingletonUptimeApi.get_instance_by_url(url).api
-    return api.get_monitors()
+    return await blocking_executor.run("uptime.get_monitors", api.get_monitors)
 
 @router.get("/get_heartbeats")
 async def get_heartbeats(url: str):
     api = SingletonUptimeApi.get_instance_by_url(url).api
-    return api.get_heartbeats()
+    return await blocking_executor.run("uptime.get_heartbeats", api.get_heartbeats)
+
+class TileBatcher:
+    """
+    合并Uptime按键的 uptime.get_tiles 调用：同一轮事件循环里的请求合并成一次调用；
+    SingletonUptimeApi 在当前数据版本已经算好的按键状态直接返回，调度器分几批执行的
+    同一页按键、相邻页的预热不再调用
+    """
+
+    def __init__(self):
+        self._pending = {}  # (url, interval) -> [(monitor_id, key_up_count, future)]
+        self._tasks = set()  # 持有flush任务的引用，避免完成前被回收
+
+    def _cached(self, url, monitor_id, key_up_count):
+        api = SingletonUptimeApi._instances.get(url)
+        if api is None:
+            return None
+        return api.cached_tile(monitor_id, tile_view(monitor_id, key_up_count))
+
+    def get(self, url, monitor_id, key_up_count, interval):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        tile = self._cached(url, monitor_id, key_up_count)
+        if tile is not None:
+            future.set_result(tile)
+            return future
+        batch = self._pending.setdefault((url, interval), [])
+        if not batch:
+            loop.call_soon(self._start_flush, loop, url, interval)
+        batch.append((monitor_id, key_up_count, future))
+        return future
+
+    def _start_flush(self, loop, url, interval):
+        task = loop.create_task(self._flush(url, interval))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, url, interval):
+        batch = self._pending.pop((url, interval), [])
+        try:
+            result = await bus.call(
+                "uptime.get_tiles",
+                url=url,
+                requests=[(monitor_id, count) for monitor_id, count, _ in batch],
+                interval=interval,
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), tile in zip(batch, result["tiles"]):
+            if not future.done():
+                future.set_result({**tile, "version": result["version"]})
+
+
+tile_batcher = TileBatcher()
+
+def chain_handler(original, apply):
+    def handler(*args):
+        if original is not None:
+            original(*args)
+        try:
+            apply(*args)
+        except Exception as e:
+            print("Failed to apply uptime event", e)
+    handler.__wrapped__ = original
+    return handler
 
 def convert_to_multiple_lines(text: str, max_lines: int = 4) -> str:
     lines = text.split(" ")
@@ -113,44 +252,47 @@ class UptimePlugin(StreamDeckPlugin):
     username: str = Field(default="")
     password: str = Field(default="")
     key_up_count: int = 0
-
-    
+    realtime: bool = False  # 订阅socket.io推送，监控状态变化后一秒内更新按键
+    seen_version: int = -1
+    icon: Any = None  # 配置的图标，显示历史柱状条时临时替换
 
     def __init__(self, **data):
         super().__init__(**data)
+        self.icon = self.image
         SingletonUptimeApi(self)
 
-    async def refresh(self, deck):
-        data = await self.async_fetch_data(f"{self.base_data_url()}/uptime/get_data",
-                        query_params = {
-                            "url": self.url, 
-                            "monitor_id": self.monitor_id, 
-                            "key_up_count": self.key_up_count,
-                            "interval": self.interval
-                        }
-                    )
+    async def prefetch(self):
+        data = await tile_batcher.get(
+            self.url, self.monitor_id, self.key_up_count, self.interval
+        )
         if data:
             self.title = data['title'] + "\n" + self.name
             self.background = data['background']
+            self.image = data.get('image') or self.icon
+        return data
+
+    async def refresh(self, deck):
+        data = await self.prefetch()
+        if data:
+            self.seen_version = data["version"]
+            self.update_screen(deck)
+
+    # 推送模式下每秒读一次内存里的状态，只有数据版本变化才重绘
+    async def refresh_if_changed(self, deck):
+        data = await self.prefetch()
+        if data and data["version"] != self.seen_version:
+            self.seen_version = data["version"]
             self.update_screen(deck)
 
-    async def run(self, deck):        
-        while not self.stop:
-            await self.refresh(deck)
-            await asyncio.sleep(self.interval)
-        
-        await self.async_fetch_data(f"{self.base_data_url()}/uptime/stop",
-                        query_params = {
-                            "url": self.url, 
-                            "monitor_id": self.monitor_id, 
-                            "key_up_count": self.key_up_count
-                        }
-                    )
-            
     async def on_will_appear(self, deck) -> None:
         await super().on_will_appear(deck)
-        self.update_screen(deck)
-        await self.run(deck)
+        self.show_placeholder(deck)
+        # 对齐到整点触发，同一页的按键在同一轮里刷新，由 tile_batcher 合并成一次查询
+        if self.realtime:
+            self.seen_version = -1
+            self.schedule(deck, self.refresh_if_changed, interval=1, align=True)
+        else:
+            self.schedule(deck, self.refresh, align=True)
 
     async def on_will_disappear(self, deck) -> None:
         await super().on_will_disappear(deck)
@@ -159,15 +301,45 @@ class UptimePlugin(StreamDeckPlugin):
         self.key_up_count = self.key_up_count + 1
         await self.refresh(deck)
 
+    async def on_unload(self) -> None:
+        api = SingletonUptimeApi._instances.get(self.url)
+        if api is not None:
+            await api.release(self)
+
 class AsyncRequester:
     def __init__(self, func, interval):
         self.func = func
+        self.skipped = 0
+        # UptimeKumaApi不是线程安全的；超时的调用还会在线程里继续运行，结束前不开始下一次
+        self._busy = threading.Lock()
         self._task = asyncio.create_task(self._fetch_periodically(interval))
         self._first_call_done_event = asyncio.Event()
 
+    def _call(self):
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return self.func()
+        finally:
+            self._busy.release()
+
     async def _fetch_periodically(self, interval):
         while True:
-            if self.func():
+            if self._busy.locked():
+                self.skipped += 1
+                await asyncio.sleep(interval)
+                continue
+            # 登录和拉取数据都是同步的socket.io调用，在线程池里执行
+            try:
+                ok = await blocking_executor.run("uptime.collect_data", self._call)
+            except asyncio.TimeoutError:
+                ok = False
+            if ok is None:
+                # 上一次超时的调用仍在运行，这一轮跳过
+                self.skipped += 1
+                await asyncio.sleep(interval)
+                continue
+            if ok:
                 self._first_call_done_event.set()
                 await asyncio.sleep(interval)
             else:
@@ -182,15 +354,19 @@ class AsyncRequester:
 
 class SingletonUptimeApi:
     '''
-    UptimeKumaApi的代理类，和接口交互，接收输入，提供数据给Plugin展示，正常情况下是定时拉取数据并更新
+    UptimeKumaApi的代理类，和接口交互，接收输入，提供数据给Plugin展示，正常情况下是定时拉取数据并更新。
+    realtime 模式下登录后只做一次完整拉取，之后由 socket.io 推送的 heartbeat / uptime / monitorList
+    事件增量更新 store；断线后重新登录时才再做完整拉取
     '''
     _instances: ClassVar[dict] = {}
     is_logged_in: bool = False    
+    realtime: bool = False
+    subscribed: bool = False
     username: str = ""
     password: str = ""
     api: UptimeKumaApi = None
     monitor_id: int = 0
-    monitors: pd.DataFrame = None
+    store: MonitorStore = None
 
     task = None
 
@@ -201,11 +377,32 @@ class SingletonUptimeApi:
         return cls._instances[key]    
 
     def __init__(self, plugin, **kwargs):
+        # 同一个url的实例只初始化一次；重新加载配置、新增按键时不重新连接，也不丢掉已有的数据。
+        # 账号或推送模式变了，由拉取线程在下一次 _login 时断开旧连接、重新登录
+        if self.api is not None:
+            self.plugins.add(id(plugin))
+            if (self.username, self.password, self.realtime) != (
+                plugin.username,
+                plugin.password,
+                plugin.realtime,
+            ):
+                self.username = plugin.username
+                self.password = plugin.password
+                self.realtime = plugin.realtime
+                self.reconnect = True
+            return
         super().__init__(**kwargs)
+        self.url = plugin.url
         self.api = UptimeKumaApi(plugin.url)
         self.username = plugin.username
         self.password = plugin.password
-        self.monitor_id = plugin.monitor_id        
+        self.monitor_id = plugin.monitor_id
+        self.realtime = plugin.realtime
+        self.reconnect = False
+        self.plugins = {id(plugin)}  # 使用这个连接的插件
+        self.store = MonitorStore()
+        self.tiles = {}  # (monitor_id, 视图) -> 按键状态，只对 tiles_version 有效
+        self.tiles_version = -1
 
     def __del__(self):
         if self.task:
@@ -216,62 +413,35 @@ class SingletonUptimeApi:
         return SingletonUptimeApi._instances[url]
 
     def collect_data(self):
-        monitors = self.api.get_monitors()        
-        uptimes =  self.api.uptime()
-        heartbeats = self.api.get_heartbeats()
-
-        df_monitors = pd.DataFrame(monitors).set_index('id')
-        data = []
-        for id, item in uptimes.items():
-            uptime_in_24 = item[24]
-            uptime_in_720 = item[720]
-            monitor = df_monitors.loc[id]
-            # status = api.get_monitor_status(id)
-
-            data.append({
-                        'id': id,
-                        'active': monitor['active'],
-                        'parent': monitor['parent'],
-                        'name': monitor['name'],
-                        'uptime_in_24': uptime_in_24, 
-                        'uptime_in_720': uptime_in_720
-                        })
-
-        df = pd.DataFrame(data)
-        all_monitors = df
-        low_uptime_monitors = df[df['uptime_in_24'] < 1]
-        low_uptime_monitors = low_uptime_monitors[low_uptime_monitors['parent'].notna()]
-
-        data = []
-        
-        for id, item in heartbeats.items():
-            if not item:
-                continue
-            
-            x = item[0]
-            x['id'] = id
-            data.append(x)
-
-        df = pd.DataFrame(data)
-        all_heartbeats = df
-
-        merged_df = pd.merge(all_monitors, all_heartbeats, left_on='id', right_on='id', how='left')
-        return merged_df
+        self.store.replace_all(
+            self.api.get_monitors(), self.api.uptime(), self.api.get_heartbeats()
+        )
 
     def _login(self):        
+        if self.reconnect:
+            self.reconnect = False
+            self._close()
+            self.api = UptimeKumaApi(self.url)
+            self.subscribed = False
+
         if not self.is_logged_in:
             try:
                 print(f"{ datetime.now() }\t==\tlogin to {self.api.url}")
                 token = self.api.login(self.username, self.password)
                 if "token" in token:
                     self.is_logged_in = True
+                    self.subscribed = False
             except Exception as e:
                 print(f"Failed to login {self.api.url} and collect data :", e)            
 
         if self.is_logged_in:
+            if self.subscribed:
+                return True  # 推送事件在持续更新store，不需要再拉取完整列表
             try:                
                 print(f"{ datetime.now() }\t==\tcollect_data at {self.api.url}")
-                self.monitors = self.collect_data().fillna(0)
+                self.collect_data()
+                if self.realtime:
+                    self._subscribe()
                 return True
             except Exception as e:
                 self.is_logged_in = False
@@ -279,11 +449,99 @@ class SingletonUptimeApi:
 
         return False
 
+    def cached_tile(self, monitor_id, view):
+        # 只读已有的结果，数据版本已经变化或还没计算时返回None
+        if self.tiles_version != self.store.version:
+            return None
+        tile = self.tiles.get((monitor_id, view))
+        return tile and {**tile, "version": self.tiles_version}
+
+    def tile(self, monitor_id, view, version):
+        # 数据版本变化后丢弃全部缓存的按键状态，之后按需重新计算
+        if version != self.tiles_version:
+            self.tiles = {}
+            self.tiles_version = version
+        tile = self.tiles.get((monitor_id, view))
+        if tile is None:
+            tile = self.tiles[(monitor_id, view)] = compute_tile(self.store, monitor_id, view)
+        return tile
+
+    def _subscribe(self):
+        # 在UptimeKumaApi自己的事件处理函数之后追加一层，保持库内部的数据也是最新的
+        handlers = self.api.sio.handlers.setdefault("/", {})
+        for event, apply in (
+            ("heartbeat", self._on_heartbeat),
+            ("uptime", self._on_uptime),
+            ("monitorList", self._on_monitor_list),
+            ("disconnect", self._on_disconnect),
+        ):
+            original = handlers.get(event)
+            if getattr(original, "__wrapped__", None) is not None:
+                original = original.__wrapped__  # 重新订阅时不要重复包装
+            self.api.sio.on(event, chain_handler(original, apply))
+        self.subscribed = True
+
+    def _on_heartbeat(self, data):
+        self.store.update_heartbeat(
+            data["monitorID"],
+            {
+                "status": data.get("status"),
+                "msg": data.get("msg"),
+                "ping": data.get("ping"),
+                "down_count": data.get("downCount", data.get("down_count")),
+            },
+        )
+
+    def _on_uptime(self, monitor_id, period, value):
+        try:
+            self.store.update_uptime(int(monitor_id), {int(period): value})
+        except (TypeError, ValueError):
+            pass  # 只关心24h和720h，其它周期（如"1y"）忽略
+
+    def _on_monitor_list(self, data):
+        self.store.replace_monitors(
+            [
+                {
+                    "id": int(id),
+                    "name": item.get("name", ""),
+                    "active": item.get("active"),
+                    "parent": item.get("parent"),
+                }
+                for id, item in data.items()
+            ]
+        )
+
+    def _on_disconnect(self, *args):
+        # 断线期间可能漏掉事件，重新登录后做一次完整拉取
+        print(f"{ datetime.now() }\t==\tdisconnected from {self.api.url}")
+        self.is_logged_in = False
+        self.subscribed = False
+
     def _logout(self):        
         if self.is_logged_in:
             self.is_logged_in = False
             self.api.logout()            
 
+    def _close(self):
+        try:
+            self._logout()
+            self.api.disconnect()
+        except Exception as e:
+            print(f"Failed to disconnect {self.api.url}:", e)
+
+    async def release(self, plugin):
+        """
+        插件被删除时调用；这个url最后一个插件也删除后，停止拉取、退出登录并丢弃实例
+        """
+        self.plugins.discard(id(plugin))
+        if self.plugins or SingletonUptimeApi._instances.get(self.url) is not self:
+            return
+        del SingletonUptimeApi._instances[self.url]
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await blocking_executor.run("uptime.logout", self._close)
+
     def get_heartbeats(self):
         return self.api.get_heartbeats()
 
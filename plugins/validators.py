@@ -0,0 +1,92 @@
+from collections import OrderedDict, defaultdict
+
+
+class Validators:
+    """
+    按请求保存上一次200响应的 ETag / Last-Modified 和解析后的结果。
+    下次请求带上 If-None-Match / If-Modified-Since，上游返回304时直接复用解析好的对象，
+    不下载也不重新解析响应体
+    """
+
+    max_entries = 512
+
+    def __init__(self):
+        self._items = OrderedDict()  # key -> (etag, last_modified, value)
+
+    @classmethod
+    def initialize(cls, config):
+        cls.max_entries = config.get("max_validators", cls.max_entries)
+
+    def headers(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return {}
+        etag, last_modified, _ = item
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def value(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        self._items.move_to_end(key)
+        return item[2]
+
+    def store(self, key, response, value):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not (etag or last_modified) or not value:
+            self._items.pop(key, None)
+            return
+        self._items[key] = (etag, last_modified, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+validators = Validators()
+
+
+class FetchStats:
+    """
+    按来源（插件类名）统计请求：调用次数、实际网络请求、304次数和下载字节数
+    """
+
+    def __init__(self):
+        self._stats = defaultdict(
+            lambda: {"calls": 0, "requests": 0, "not_modified": 0, "bytes": 0}
+        )
+
+    def call(self, source):
+        self._stats[source or "-"]["calls"] += 1
+
+    def response(self, source, response):
+        stat = self._stats[source or "-"]
+        stat["requests"] += 1
+        stat["bytes"] += response.num_bytes_downloaded
+        if response.status_code == 304:
+            stat["not_modified"] += 1
+
+    def stats(self):
+        result = {}
+        for source, stat in self._stats.items():
+            calls, requests = stat["calls"], stat["requests"]
+            result[source] = {
+                **stat,
+                # 命中fetch缓存、不需要访问网络的比例
+                "cache_hit_rate": max(0.0, 1 - requests / calls) if calls else 0.0,
+                # 访问网络时上游返回304的比例
+                "not_modified_rate": stat["not_modified"] / requests if requests else 0.0,
+                "bytes_per_request": stat["bytes"] / requests if requests else 0.0,
+            }
+        return result
+
+
+fetch_stats = FetchStats()
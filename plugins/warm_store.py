@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from plugins.key_writer import digest_of
+from plugins.render_cache import Frame
+
+logger = logging.getLogger("asyncio")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frame (
+    key TEXT PRIMARY KEY,
+    image BLOB NOT NULL,
+    native BLOB NOT NULL,
+    pressed BLOB NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class WarmStore:
+    """
+    把拉取的数据和每个按键最后渲染的帧保存到SQLite，重启后直接从磁盘画出第一帧。
+    写入先放在内存里，由后台任务按 flush_interval 批量落盘（write-behind），减少SD卡写入次数
+    """
+
+    path = "./warm_cache.db"
+    flush_interval = 60  # seconds
+    max_stale = 3600  # 过期超过这么久的拉取数据删除，重启后也用不上
+    max_fetches = 256  # fetch 表最多保留的行数，URL里带日期之类的key不会无限增长
+
+    def __init__(self):
+        self._db = None
+        self._lock = threading.Lock()
+        self._fetches = {}  # key -> (json, expires)
+        self._frames = {}  # key -> Frame
+        self.flushes = 0
+        self.rows_written = 0
+
+    def initialize(self, config):
+        self.path = config.get("path", self.path)
+        self.flush_interval = config.get("flush_interval", self.flush_interval)
+        self.max_stale = config.get("max_stale", self.max_stale)
+        self.max_fetches = config.get("max_fetches", self.max_fetches)
+        if not self.path:
+            return
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+        except Exception as e:
+            logger.error(f"Failed to open warm store {self.path}: {e}")
+            self._db = None
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def put_fetch(self, key, value, expires):
+        """
+        expires: 过期的墙上时间 time.time()
+        """
+        if self.enabled:
+            self._fetches[key] = (value, expires)
+
+    def put_frame(self, key, frame):
+        if self.enabled:
+            self._frames[key] = frame
+
+    def load_fetches(self):
+        if not self.enabled:
+            return {}
+        with self._lock, self._db:
+            self._prune_fetches()
+            rows = self._db.execute("SELECT key, value, expires FROM fetch").fetchall()
+        return {key: (json.loads(value), expires) for key, value, expires in rows}
+
+    def load_frames(self):
+        if not self.enabled:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, image, native, pressed FROM frame"
+            ).fetchall()
+        frames = {}
+        for key, image, native, pressed in rows:
+            try:
+                frames[key] = Frame(
+                    Image.open(BytesIO(image)).convert("RGB"),
+                    native,
+                    digest_of(native),
+                    pressed,
+                    digest_of(pressed),
+                )
+            except Exception as e:
+                logger.error(f"Failed to load frame {key}: {e}")
+        return frames
+
+    def flush(self):
+        self._write(*self._take_pending())
+
+    async def flush_async(self):
+        # 在事件循环里取走待写数据，编码和SQLite写入放到线程里
+        pending = self._take_pending()
+        await asyncio.to_thread(self._write, *pending)
+
+    def _take_pending(self):
+        fetches, self._fetches = self._fetches, {}
+        frames, self._frames = self._frames, {}
+        return fetches, frames
+
+    def _write(self, fetches, frames):
+        if not self.enabled or not (fetches or frames):
+            return
+        now = time.time()
+        fetch_rows = [
+            (key, json.dumps(value), expires)
+            for key, (value, expires) in fetches.items()
+        ]
+        frame_rows = []
+        for key, frame in frames.items():
+            buffer = BytesIO()
+            frame.image.save(buffer, "PNG")
+            frame_rows.append(
+                (key, buffer.getvalue(), bytes(frame.native), bytes(frame.pressed), now)
+            )
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO fetch VALUES (?, ?, ?)", fetch_rows
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO frame VALUES (?, ?, ?, ?, ?)", frame_rows
+            )
+            if fetch_rows:
+                self._prune_fetches()
+        self.flushes += 1
+        self.rows_written += len(fetch_rows) + len(frame_rows)
+
+    def _prune_fetches(self):
+        # 调用方持有 _lock 并在事务中：先删过期太久的行，再按过期时间只保留最新的 max_fetches 行
+        self._db.execute(
+            "DELETE FROM fetch WHERE expires < ?", (time.time() - self.max_stale,)
+        )
+        self._db.execute(
+            "DELETE FROM fetch WHERE key NOT IN "
+            "(SELECT key FROM fetch ORDER BY expires DESC LIMIT ?)",
+            (self.max_fetches,),
+        )
+
+    def prune_frames(self, live):
+        """
+        删除不在 live 中的帧（配置变化或页面删除后留下的旧帧id）
+        """
+        if not self.enabled:
+            return
+        for key in [key for key in self._frames if key not in live]:
+            del self._frames[key]
+        with self._lock, self._db:
+            keys = [row[0] for row in self._db.execute("SELECT key FROM frame")]
+            self._db.executemany(
+                "DELETE FROM frame WHERE key = ?",
+                [(key,) for key in keys if key not in live],
+            )
+
+    def close(self):
+        if self.enabled:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "enabled": self.enabled,
+            "pending": len(self._fetches) + len(self._frames),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
+
+
+warm_store = WarmStore()
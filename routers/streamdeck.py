@@ -3,10 +3,25 @@ from pydantic import BaseModel
 from typing import Dict, List
 import logging
 
-logger = logging.getLogger("admin-api")
+from plugins import plugin_registry
+from plugins.bus import bus
+from plugins.circuit_breaker import CircuitBreaker
+from plugins.compositor import compositor_stats
+from plugins.encoder import encode_cache
+from plugins.executor import blocking_executor
+from plugins.fetch_cache import fetch_cache
+from plugins.http_pool import HttpClientPool
+from plugins.key_writer import key_writer
+from plugins.marquee import marquee_scheduler
+from plugins.render_cache import frame_cache
+from plugins.plugin import StreamingSource
+from plugins.render_pool import render_pool
+from plugins.scheduler import poll_scheduler
+from plugins.text_cache import text_cache
+from plugins.validators import fetch_stats, validators
+from plugins.warm_store import warm_store
 
-dm = None
-next_page = None
+logger = logging.getLogger("admin-api")
 
 router = APIRouter(
     prefix="/admin",
@@ -18,22 +33,55 @@ router = APIRouter(
 async def health_check():
     return "OK"
 
+@router.get("/stats")
+async def stats():
+    return {
+        "frame_cache": frame_cache.stats(),
+        "text_cache": text_cache.stats(),
+        "encode_cache": encode_cache.stats(),
+        "key_writer": key_writer.stats(),
+        "compositor": compositor_stats(),
+        "render_pool": render_pool.stats(),
+        "executor": blocking_executor.stats(),
+        "marquee": marquee_scheduler.stats(),
+        "http": HttpClientPool.stats(),
+        "fetch_cache": fetch_cache.stats(),
+        "fetch_sources": fetch_stats.stats(),
+        "validators": len(validators),
+        "upstreams": CircuitBreaker.all_stats(),
+        "streams": StreamingSource.all_stats(),
+        "warm_store": warm_store.stats(),
+        "bus": bus.stats(),
+        "plugins": plugin_registry.report(),
+    }
+
+@router.get("/scheduler")
+async def scheduler():
+    return poll_scheduler.stats()
+
 @router.get("/lcd_on")
 async def lcd_on():
-    await dm.screen_on()
+    await bus.call("admin.lcd_on")
 
 @router.get("/lcd_off")
 async def lcd_off():
-    await dm.screen_off()
+    await bus.call("admin.lcd_off")
 
 @router.get("/down")
 async def down():
-    dm.close()
+    await bus.call("admin.down")
 
 @router.get("/prev")
 async def prev():
-    await next_page(-1)
+    await bus.call("admin.prev")
 
 @router.get("/next")
 async def next():
-    await next_page(1)
\ No newline at end of file
+    await bus.call("admin.next")
+
+@router.get("/reload")
+async def reload():
+    try:
+        return await bus.call("admin.reload")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"reload failed: {e}")